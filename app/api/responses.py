@@ -0,0 +1,8 @@
+from fastapi.responses import JSONResponse
+from services.json_codec import dumps
+
+class CodecJSONResponse(JSONResponse):
+    """JSONResponse encoded with the configured codec (services.json_codec), orjson when it is installed."""
+
+    def render(self, content):
+        return dumps(content)
@@ -0,0 +1,80 @@
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Response
+from services import queries
+from services.response_cache import get_response_cache
+from services.metrics import CONTENT_TYPE, render_metrics
+from api.responses import CodecJSONResponse
+
+router = APIRouter()
+
+async def _cached(table, key, loader):
+    """Serves a response from the shared TTL/LRU cache. Entries are dropped when table is re-ingested."""
+    return await get_response_cache().get_or_load_async((table,) + key, loader)
+
+def _json(content):
+    """Encodes rows straight with the JSON codec, skipping FastAPI's much slower jsonable_encoder pass."""
+    return CodecJSONResponse(content)
+
+def _found(row, what):
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"{what} not found")
+    return row
+
+@router.get("/teams")
+async def list_teams():
+    return _json(await _cached("teams", ("list",), queries.get_teams))
+
+@router.get("/teams/{code}")
+async def get_team(code: str):
+    return _json(_found(await _cached("teams", ("one", code), lambda: queries.get_team(code)), "Team"))
+
+@router.get("/players")
+async def list_players(team: Optional[str] = None, limit: int = Query(100, ge=1, le=1000),
+                       offset: int = Query(0, ge=0)):
+    return _json(await _cached("players", ("list", team, limit, offset),
+                               lambda: queries.get_players(team, limit, offset)))
+
+@router.get("/players/{code}")
+async def get_player(code: str):
+    return _json(_found(await _cached("players", ("one", code), lambda: queries.get_player(code)), "Player"))
+
+@router.get("/games")
+async def list_games(start: Optional[date] = None, end: Optional[date] = None, team: Optional[str] = None,
+                     status: Optional[str] = None, limit: int = Query(100, ge=1, le=1000),
+                     offset: int = Query(0, ge=0)):
+    return _json(await _cached("games", ("list", start, end, team, status, limit, offset),
+                               lambda: queries.get_games(start, end, team, status, limit, offset)))
+
+@router.get("/games/{game_id}")
+async def get_game(game_id: str):
+    return _json(_found(await _cached("games", ("one", game_id), lambda: queries.get_game(game_id)), "Game"))
+
+@router.get("/statlines")
+async def list_player_statlines(player_id: Optional[str] = None, season: Optional[int] = None,
+                                game_id: Optional[str] = None, position: Optional[str] = None,
+                                limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    return _json(await _cached("player_statlines", ("list", player_id, season, game_id, position, limit, offset),
+                               lambda: queries.get_player_statlines(player_id, season, game_id, position,
+                                                                    limit, offset)))
+
+@router.get("/summaries/teams")
+async def list_team_summaries(season: Optional[int] = None, team: Optional[str] = None):
+    return _json(await _cached("team_season_summaries", ("list", season, team),
+                               lambda: queries.get_team_summaries(season, team)))
+
+@router.get("/summaries/players")
+async def list_player_summaries(season: Optional[int] = None, position: Optional[str] = None,
+                                player_id: Optional[str] = None, limit: int = Query(100, ge=1, le=1000),
+                                offset: int = Query(0, ge=0)):
+    return _json(await _cached("player_season_summaries", ("list", season, position, player_id, limit, offset),
+                               lambda: queries.get_player_summaries(season, position, player_id, limit, offset)))
+
+@router.get("/cache/stats")
+async def cache_stats():
+    return get_response_cache().stats()
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint: NatStat, upsert, job, pool and API request metrics."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
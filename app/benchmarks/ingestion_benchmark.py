@@ -0,0 +1,180 @@
+"""
+End-to-end ingestion benchmark. Starts the NatStat stand-in (benchmarks.natstat_stub) in a child process,
+points ingestion at it and runs each ingestion stage against the Postgres configured by the DB_* settings,
+reporting pages/sec, rows/sec, p50/p99 request latency and peak RSS per stage.
+
+The stages write to the teams, players, games and player_statlines tables, so point DB_NAME at a scratch
+database. Run from app/:
+
+    python -m benchmarks.ingestion_benchmark --latency-ms 50 --error-rate 0.01 --output bench.json
+    python -m benchmarks.ingestion_benchmark --baseline bench.json --max-regression 0.2
+
+With --baseline the run exits 1 when a stage's rows/sec falls more than --max-regression below the baseline.
+Injected 429s add randomized backoff, so gate on runs with --error-rate 0 and compare like-for-like sizes.
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import multiprocessing
+import urllib.request
+from .natstat_stub import serve, add_server_arguments, DEFAULT_SIZES
+
+STAGES = ("teams", "players", "games", "statlines", "statlines_frame")
+
+def _wait_for_server(base_url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"{base_url}/_stats", timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"NatStat stand-in did not start at {base_url}")
+            time.sleep(0.1)
+
+def _served_pages(base_url):
+    """Successful responses served so far (429s excluded)."""
+    with urllib.request.urlopen(f"{base_url}/_stats") as response:
+        served = json.loads(response.read())
+    return sum(count for route, count in served.items() if route != "429")
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _stage_functions():
+    """Stage name -> fn returning the number of rows it processed. Imported late so env overrides apply."""
+    from services import data_ingestion
+    from plumbing import natstat_ingestion
+
+    def rows(counts):
+        return sum(counts.get(key, 0) for key in ("inserted", "updated", "unchanged"))
+
+    def statlines_frame():
+        teams_df = natstat_ingestion.ingest_teams_data()
+        players_df = natstat_ingestion.ingest_players_data(teams_df)
+        return len(natstat_ingestion.get_player_statlines(players_df))
+
+    return {
+        "teams": lambda: rows(data_ingestion.ingest_teams_data()),
+        "players": lambda: rows(data_ingestion.ingest_players_data()),
+        "games": lambda: rows(data_ingestion.ingest_games_data(full_backfill=True)),
+        "statlines": lambda: rows(natstat_ingestion.ingest_player_statlines(refresh=False)),
+        "statlines_frame": statlines_frame,
+    }
+
+def run_stage(name, fn, base_url, stats):
+    """Runs one stage and returns its measurements."""
+    stats.reset_latencies()
+    before_stats, before_pages = stats.snapshot(), _served_pages(base_url)
+    started = time.perf_counter()
+    rows = fn()
+    seconds = time.perf_counter() - started
+    after_stats, pages = stats.snapshot(), _served_pages(base_url) - before_pages
+    latencies = stats.latency_percentiles((0.5, 0.99))
+    return {
+        "seconds": round(seconds, 3),
+        "pages": pages,
+        "pages_per_second": round(pages / seconds, 1) if seconds else None,
+        "rows": rows,
+        "rows_per_second": round(rows / seconds, 1) if seconds else None,
+        "p50_ms": round(latencies[0.5] * 1000, 1) if latencies else None,
+        "p99_ms": round(latencies[0.99] * 1000, 1) if latencies else None,
+        "throttled": after_stats["throttled"] - before_stats["throttled"],
+        "retries": after_stats["retries"] - before_stats["retries"],
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+def print_report(results):
+    columns = ("seconds", "pages", "pages_per_second", "rows", "rows_per_second", "p50_ms", "p99_ms",
+               "throttled", "retries", "peak_rss_mb")
+    print(f"{'stage':<16}" + "".join(f"{column:>18}" for column in columns))
+    for name, result in results.items():
+        print(f"{name:<16}" + "".join(f"{str(result[column]):>18}" for column in columns))
+
+def compare_to_baseline(results, baseline, max_regression):
+    """Stages whose rows/sec dropped more than max_regression (a fraction) below the baseline run."""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get("stages", {}).get(name, {}).get("rows_per_second")
+        actual = result["rows_per_second"]
+        if expected and actual is not None and actual < expected * (1 - max_regression):
+            regressions.append(f"{name}: {result['rows_per_second']} rows/s vs baseline {expected}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765, help="Port for the NatStat stand-in")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="Apply the NatStat token bucket to the stand-in (off: measure ingestion, not the plan)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare rows/sec against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed rows/sec drop vs the baseline")
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)}")
+
+    sizes = {name: getattr(args, name) for name in DEFAULT_SIZES}
+    server_options = {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate,
+                      "retry_after": args.retry_after}
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = multiprocessing.Process(target=serve, kwargs=dict(port=args.port, **server_options, **sizes),
+                                     daemon=True)
+    server.start()
+    try:
+        _wait_for_server(base_url)
+
+        # Must be set before the services modules are imported; they read their settings at import time.
+        # Archiving and conditional requests stay off unless set explicitly, so every run does the full work.
+        os.environ["NATSTAT_BASE_URL"] = base_url
+        os.environ["INTERSTAT_BASE_URL"] = base_url
+        os.environ["NATSTAT_API"] = "benchmark"
+        os.environ["NATSTAT_RATE_LIMITED_HOSTS"] = "127.0.0.1" if args.rate_limit else ""
+        os.environ.setdefault("RESPONSE_ARCHIVE_ENABLED", "0")
+        os.environ.setdefault("NATSTAT_CONDITIONAL_REQUESTS", "0")
+
+        from services.migrations import run_migrations
+        from services.natstat_client import get_natstat_client
+        from services.async_ingestion import close_engine
+        run_migrations()
+        stats = get_natstat_client().stats
+        functions = _stage_functions()
+
+        results = {}
+        try:
+            for stage in stages:
+                print(f"Benchmarking stage '{stage}'...")
+                results[stage] = run_stage(stage, functions[stage], base_url, stats)
+        finally:
+            close_engine()
+    finally:
+        server.terminate()
+        server.join()
+
+    print_report(results)
+    report = {"stages": results, "server": dict(server_options, **sizes), "finished_at": time.time()}
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), args.max_regression)
+        if regressions:
+            print("Throughput regressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print("No throughput regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
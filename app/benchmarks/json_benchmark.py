@@ -0,0 +1,115 @@
+"""
+Compares the JSON codecs on recorded NatStat payloads: decoding every archived response body (see
+services.response_archive) and encoding their records the way the API serializes rows. Falls back to pages
+from the NatStat stand-in when the archive is empty. Run from app/:
+
+    python -m benchmarks.json_benchmark --repeat 5
+"""
+import sys
+import json
+import time
+import argparse
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+from services.json_codec import CODECS
+from services.response_archive import ResponseArchive, RESPONSE_ARCHIVE_DIR
+from api.responses import CodecJSONResponse
+from .natstat_stub import StubDataset, DEFAULT_SIZES
+
+PAGE_ENDPOINTS = ("teams", "players", "games")
+
+def recorded_payloads(archive_dir, limit):
+    """(endpoint, body) for the latest archived body of each URL."""
+    archive = ResponseArchive(root=archive_dir)
+    entries = archive.entries()[:limit] if limit else archive.entries()
+    return [(entry["endpoint"], archive.read_blob(entry["sha256"])) for entry in entries]
+
+def synthetic_payloads():
+    dataset = StubDataset(**DEFAULT_SIZES)
+    return [
+        ("teams", json.dumps(dataset.natstat_teams()).encode()),
+        ("players", json.dumps(dataset.natstat_players(1, "http://stub/players")).encode()),
+        ("games", json.dumps(dataset.natstat_games(1, "http://stub/games")).encode()),
+        ("statlines", json.dumps(dataset.interstat_statlines(1001, 2024)).encode()),
+    ]
+
+def _records(endpoint, data):
+    """The row-like records of a decoded payload, shaped like an API list response."""
+    if endpoint in PAGE_ENDPOINTS and isinstance(data.get(endpoint), dict):
+        return list(data[endpoint].values())
+    return [data]
+
+def _time(fn, items, repeat):
+    """Best of repeat runs of fn over every item, in seconds."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            fn(item)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def _ingest(endpoint, data):
+    """
+    Reads a decoded payload the way services.data_ingestion does: the teams records, or a paginated page's
+    envelope lookups around its records. Other payloads are used as decoded.
+    """
+    if endpoint == "teams":
+        for _ in data["teams"].items():
+            pass
+    elif endpoint in PAGE_ENDPOINTS and data.get("success") == "1" and endpoint in data:
+        data["meta"].get("page-next")
+        for _ in data[endpoint].items():
+            pass
+        data["query"].get("uri")
+
+def _decode_with(loads):
+    """loads(endpoint, body), followed by the ingestion reads, as a function of one payload."""
+    return lambda payload: _ingest(payload[0], loads(*payload))
+
+def run(payloads, repeat):
+    """Returns {(operation, implementation): seconds}."""
+    results = {}
+    total = sum(len(body) for endpoint, body in payloads)
+    # Every decoder sees the same payloads and the same access pattern as ingestion
+    for name, codec in CODECS.items():
+        results[("decode", name)] = _time(_decode_with(lambda endpoint, body: codec.loads(body)), payloads, repeat)
+
+    rows = [_records(endpoint, json.loads(body)) for endpoint, body in payloads]
+    # FastAPI's default path (jsonable_encoder, then the stdlib JSONResponse) against what the routes now return
+    results[("encode", "fastapi default")] = _time(
+        lambda content: JSONResponse(jsonable_encoder(content)).body, rows, repeat)
+    results[("encode", "api routes")] = _time(lambda content: CodecJSONResponse(content).body, rows, repeat)
+    for name, codec in CODECS.items():
+        results[("encode", f"{name} direct")] = _time(codec.dumps, rows, repeat)
+    return results, total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive-dir", default=RESPONSE_ARCHIVE_DIR)
+    parser.add_argument("--limit", type=int, default=0, help="Archived responses to use (0: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the best is reported")
+    args = parser.parse_args(argv)
+
+    payloads = recorded_payloads(args.archive_dir, args.limit)
+    source = f"{len(payloads)} archived responses"
+    if not payloads:
+        payloads = synthetic_payloads()
+        source = f"{len(payloads)} synthetic pages (response archive at {args.archive_dir} is empty)"
+    results, total = run(payloads, args.repeat)
+
+    print(f"{source}, {total / 1e6:.1f} MB")
+    print(f"{'operation':<10}{'implementation':<18}{'ms':>10}{'MB/s':>10}{'vs first':>10}")
+    for operation in ("decode", "encode"):
+        first = None
+        for (op, implementation), seconds in results.items():
+            if op != operation:
+                continue
+            first = first or seconds
+            print(f"{op:<10}{implementation:<18}{seconds * 1000:>10.1f}{total / 1e6 / seconds:>10.1f}"
+                  f"{first / seconds:>9.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+import json
+import random
+import asyncio
+import argparse
+from collections import Counter
+from aiohttp import web
+
+# Synthetic NatStat / interst.at stand-in for the ingestion benchmark. Every response is generated from the
+# dataset sizes, so two servers started with the same sizes serve the same bodies.
+SEASON = 2024
+DEFAULT_SIZES = {
+    "teams": 32,
+    "players_per_team": 53,
+    "games": 272,
+    "statlines_per_player": 17,
+    "page_size": 100,
+}
+POSITIONS = ("QB", "RB", "WR", "TE", "K")
+
+class StubDataset:
+    """Deterministic league: teams, rostered players, a season of games and per-player statlines."""
+
+    def __init__(self, teams, players_per_team, games, statlines_per_player, page_size):
+        self.page_size = page_size
+        self.statlines_per_player = statlines_per_player
+        self.team_codes = [f"T{index:02d}" for index in range(1, teams + 1)]
+        self.players = [
+            {"id": team_index * 1000 + number, "team": code, "position": POSITIONS[number % len(POSITIONS)]}
+            for team_index, code in enumerate(self.team_codes, start=1)
+            for number in range(1, players_per_team + 1)
+        ]
+        self.games = [
+            {
+                "id": 500000 + index,
+                "home": self.team_codes[index % teams],
+                "visitor": self.team_codes[(index + 1 + index // teams) % teams],
+                "gameday": f"{SEASON}-09-{5 + index % 20:02d}",
+            }
+            for index in range(games)
+        ]
+
+    def page(self, items, page):
+        """Items of a 1-based page and whether a next page exists."""
+        start = (page - 1) * self.page_size
+        return items[start:start + self.page_size], start + self.page_size < len(items)
+
+    def natstat_teams(self):
+        return {
+            "success": "1",
+            "teams": {
+                f"team_{code}": {"code": code, "name": f"Team {code}", "location": f"City {code}"}
+                for code in self.team_codes
+            },
+        }
+
+    def natstat_players(self, page, url):
+        players, more = self.page(self.players, page)
+        return {
+            "success": "1",
+            "players": {
+                f"player_{player['id']}": {
+                    "code": str(player["id"]),
+                    "name": f"Player {player['id']}",
+                    "team": f"Team {player['team']}",
+                    "team-code": player["team"],
+                }
+                for player in players
+            },
+            "meta": {"page": str(page), **({"page-next": f"{url}?page={page + 1}"} if more else {})},
+            "query": {"uri": f"{url}?page={page}"},
+        }
+
+    def natstat_games(self, page, url):
+        games, more = self.page(self.games, page)
+        return {
+            "success": "1",
+            "games": {
+                f"game_{game['id']}": {
+                    "id": str(game["id"]),
+                    "visitor": f"Team {game['visitor']}",
+                    "visitor-code": game["visitor"],
+                    "score-vis": str(game["id"] % 35),
+                    "home": f"Team {game['home']}",
+                    "home-code": game["home"],
+                    "score-home": str(game["id"] % 31),
+                    "gamestatus": "Final",
+                    "overtime": "N",
+                    "winner-code": game["home"],
+                    "loser-code": game["visitor"],
+                    "gameday": game["gameday"],
+                    "gameno": str(game["id"]),
+                    "venue": f"Stadium {game['home']}",
+                    "venue-code": game["home"],
+                }
+                for game in games
+            },
+            "meta": {"page": str(page), **({"page-next": f"{url}?page={page + 1}"} if more else {})},
+            "query": {"uri": f"{url}?page={page}"},
+        }
+
+    def interstat_teams(self, base_url):
+        return {
+            "teams": {
+                f"team_{code}": {
+                    "id": code,
+                    "name": f"Team {code}",
+                    "nickname": code,
+                    "fullname": f"City {code} Team {code}",
+                    "code": code,
+                    "meta": {"apiurl": f"{base_url}/team/pfb/{code}", "siteurl": f"{base_url}/site/{code}"},
+                }
+                for code in self.team_codes
+            }
+        }
+
+    def interstat_roster(self, base_url, team_code):
+        return {
+            "players": {
+                f"player_{player['id']}": {
+                    "id": str(player["id"]),
+                    "name": f"Player {player['id']}",
+                    "position": player["position"],
+                    "jersey": str(player["id"] % 100),
+                    "experience": str(player["id"] % 15),
+                    "bio": {"height_ftin": "6-2", "weight_lbs": "215"},
+                    "meta": {"apiurl": f"{base_url}/statline/{player['id']}"},
+                }
+                for player in self.players if player["team"] == team_code
+            }
+        }
+
+    def interstat_game(self, base_url, game_id):
+        """One game's detail with its rostered players, or None for an unknown game id."""
+        index = game_id - 500000
+        if not 0 <= index < len(self.games):
+            return None
+        game = self.games[index]
+        return {
+            "games": {
+                f"game_{game_id}": {
+                    "id": str(game_id),
+                    "gameday": game["gameday"],
+                    "starttime": "13:00",
+                    "status": "Final",
+                    "visitor": {"team": f"Team {game['visitor']}", "score": str(game_id % 35)},
+                    "home": {"team": f"Team {game['home']}", "score": str(game_id % 31)},
+                    "venue": {"name": f"Stadium {game['home']}"},
+                    "attendance": str(60000 + game_id % 10000),
+                    "players": {
+                        f"player_{player['id']}": {
+                            "id": str(player["id"]),
+                            "name": f"Player {player['id']}",
+                            "team": {"name": f"Team {player['team']}"},
+                            "position": player["position"],
+                            "starter": "Y" if player["id"] % 2 else "N",
+                        }
+                        for player in self.players if player["team"] in (game["home"], game["visitor"])
+                    },
+                    "meta": {"apiurl": f"{base_url}/game/pfb/{game_id}"},
+                }
+            }
+        }
+
+    def interstat_statlines(self, player_id, season):
+        statlines = {}
+        for week in range(1, self.statlines_per_player + 1):
+            seed = player_id * 100 + week
+            statlines[f"statline_{seed}"] = {
+                "id": str(seed),
+                "position": POSITIONS[player_id % len(POSITIONS)],
+                "date": f"{season}-09-{min(week, 28):02d}",
+                "season": str(season),
+                "game": {"id": str(500000 + seed % 272)},
+                "team": {"id": str(player_id // 1000), "name": f"Team T{player_id // 1000:02d}"},
+                "opponent": {"id": str(week), "name": f"Team T{week:02d}"},
+                "passatt": str(seed % 40), "passcomp": str(seed % 25), "passyds": str(seed % 350),
+                "passypa": "7.1", "passtd": str(seed % 4), "passint": str(seed % 2),
+                "rushatt": str(seed % 20), "rushyds": str(seed % 120), "rushypa": "4.3", "rushtd": str(seed % 2),
+                "rushlong": str(seed % 45), "rec": str(seed % 9), "recyds": str(seed % 140), "recypr": "11.2",
+                "rectd": str(seed % 2), "reclong": str(seed % 60), "kickfga": str(seed % 4), "kickfgm": str(seed % 3),
+                "perfscore": str(seed % 90), "perfscoreseasonavg": "42.0", "presencerate": "0.8",
+                "adjpresencerate": "0.75", "statline": f"Week {week}",
+            }
+        return {
+            "players": {
+                f"player_{player_id}": {
+                    "stats": {
+                        "playerstatline": statlines,
+                        "pcr": {"season": str(season), "efficiency": "0.62", "efficiencypoints": "10",
+                                "pcrpoints": str(player_id % 100), "pcrrank": str(player_id % 500)},
+                    }
+                }
+            }
+        }
+
+class StubServer:
+    """
+    aiohttp app serving StubDataset with an added per-request latency (latency_ms +/- jitter_ms) and
+    HTTP 429s injected at error_rate. Counts served pages per route under /_stats.
+    """
+
+    def __init__(self, dataset, latency_ms=0, jitter_ms=0, error_rate=0.0, retry_after=0, seed=0):
+        self.dataset = dataset
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.served = Counter()
+
+    def base_url(self, request):
+        return f"{request.scheme}://{request.host}"
+
+    @web.middleware
+    async def inject_faults(self, request, handler):
+        if request.path.startswith("/_"):
+            return await handler(request)
+        delay = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        route = request.match_info.route.name or "unknown"
+        if self.random.random() < self.error_rate:
+            self.served["429"] += 1
+            return web.Response(status=429, headers={"Retry-After": str(self.retry_after)})
+        response = await handler(request)
+        self.served[route] += 1
+        return response
+
+    @staticmethod
+    def _json(data):
+        return web.Response(body=json.dumps(data).encode(), content_type="application/json")
+
+    async def natstat_teams(self, request):
+        return self._json(self.dataset.natstat_teams())
+
+    async def natstat_players(self, request):
+        page = int(request.query.get("page", "1"))
+        return self._json(self.dataset.natstat_players(page, self.base_url(request) + request.path))
+
+    async def natstat_games(self, request):
+        page = int(request.query.get("page", "1"))
+        return self._json(self.dataset.natstat_games(page, self.base_url(request) + request.path))
+
+    async def interstat_teams(self, request):
+        return self._json(self.dataset.interstat_teams(self.base_url(request)))
+
+    async def interstat_roster(self, request):
+        return self._json(self.dataset.interstat_roster(self.base_url(request), request.match_info["team"]))
+
+    async def interstat_game(self, request):
+        data = self.dataset.interstat_game(self.base_url(request), int(request.match_info["game"]))
+        if data is None:
+            raise web.HTTPNotFound()
+        return self._json(data)
+
+    async def interstat_statlines(self, request):
+        player_id, _, season = request.match_info["player"].partition(",")
+        return self._json(self.dataset.interstat_statlines(int(player_id), int(season or SEASON)))
+
+    async def stats(self, request):
+        return self._json(dict(self.served))
+
+    def app(self):
+        app = web.Application(middlewares=[self.inject_faults])
+        app.router.add_get("/_stats", self.stats)
+        app.router.add_get("/{key}/teams/PFB/{season}", self.natstat_teams, name="teams")
+        app.router.add_get("/{key}/players/PFB/{season}", self.natstat_players, name="players")
+        app.router.add_get("/{key}/games/PFB/{range}", self.natstat_games, name="games")
+        app.router.add_get("/team/pfb/{season}", self.interstat_teams, name="roster_teams")
+        app.router.add_get("/player/pfb/{team}", self.interstat_roster, name="roster_players")
+        app.router.add_get("/game/pfb/{game:[0-9]+}", self.interstat_game, name="game")
+        app.router.add_get("/statline/{player}", self.interstat_statlines, name="statlines")
+        return app
+
+def serve(host="127.0.0.1", port=8765, latency_ms=0, jitter_ms=0, error_rate=0.0, retry_after=0, **sizes):
+    """Runs the stand-in server until interrupted. sizes override DEFAULT_SIZES."""
+    dataset = StubDataset(**dict(DEFAULT_SIZES, **sizes))
+    server = StubServer(dataset, latency_ms, jitter_ms, error_rate, retry_after)
+    web.run_app(server.app(), host=host, port=port, print=None, access_log=None)
+
+def add_server_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=20, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=5, help="Uniform +/- jitter on the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After seconds sent with each 429")
+    for name, default in DEFAULT_SIZES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local NatStat/interst.at stand-in for ingestion benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = vars(parser.parse_args())
+    print(f"Serving NatStat stand-in on http://{args['host']}:{args['port']}")
+    serve(**args)
@@ -1,25 +1,93 @@
-from datetime import datetime
-from fastapi import FastAPI
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from functools import partial
+from fastapi import FastAPI, Request
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from services.schema_setup import (
-    setup_teams_table,
-    setup_players_table,
-    setup_games_table
-)
-from services.data_ingestion import (
-    ingest_teams_data,
-    ingest_players_data,
-    ingest_games_data
-)
+from apscheduler.triggers.date import DateTrigger
+from services.migrations import run_migrations
+from services.schema_setup import report_index_usage
+from services.summaries import refresh_summaries
+from services.db_connection import close_pool
+from services.async_db import open_async_pool, close_async_pool
+from services.async_ingestion import close_engine
+from services.data_ingestion import ingest_teams_data, ingest_players_data, ingest_games_data
+from services.job_graph import JobGraph
+from services.metrics import HTTP_REQUEST_SECONDS, track_job
+from services.profiling import profiled, profiled_async, should_profile_request
+from services.live_polling import LIVE_POLLING_ENABLED, LIVE_POLL_INTERVAL, poll_live_games
+from plumbing.natstat_ingestion import ingest_player_statlines
+from api.routes import router
+from api.responses import CodecJSONResponse
 
-app = FastAPI()
+# Logging is configured once here, for the API process; library modules only create their loggers
+logging.basicConfig(level=logging.INFO)
+
+app = FastAPI(default_response_class=CodecJSONResponse)
+app.include_router(router)
 scheduler = BackgroundScheduler()
 
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    """Times every API request for /metrics, labelled by route template so path parameters do not add series."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                     route=route.path if route else "unmatched", status=status)
+
+@app.middleware("http")
+async def profile_sampled_requests(request: Request, call_next):
+    """
+    With PROFILING_ENABLED, profiles a PROFILING_API_SAMPLE_RATE share of requests. Only the event loop
+    thread is sampled, so requests served concurrently on it share the profile.
+    """
+    if not should_profile_request():
+        return await call_next(request)
+    async with profiled_async(f"api {request.method} {request.url.path}", thread_ids=[threading.get_ident()]) as tags:
+        response = await call_next(request)
+        tags.update(method=request.method, path=request.url.path, status_code=response.status_code)
+        return response
+
+# Weekly refresh as one dependency graph: teams before players and statlines, games alongside them,
+# summaries once the games and statlines they are built from are in. ADD WEEKLY STAGES HERE
+weekly_graph = (
+    JobGraph("weekly_refresh")
+    .add("teams", ingest_teams_data)
+    .add("players", ingest_players_data, depends_on=["teams"])
+    .add("games", ingest_games_data)
+    .add("player_statlines", partial(ingest_player_statlines, refresh=False), depends_on=["teams"])
+    .add("summaries", refresh_summaries, depends_on=["games", "player_statlines"])
+)
+
+def weekly_refresh():
+    return weekly_graph.run()
+
+def live_poll():
+    """
+    Live-score mode: polls the games in progress and schedules its own next run, every LIVE_POLL_INTERVAL
+    seconds inside a game window and at the next window opening outside one.
+    """
+    next_run = datetime.now() + timedelta(seconds=LIVE_POLL_INTERVAL)  # Retry soon if the poll fails
+    try:
+        with track_job("live_poll"), profiled("live_poll") as profile_tags:
+            next_run = poll_live_games()
+            profile_tags.update(job="live_poll", next_run=next_run)
+    finally:
+        scheduler.add_job(live_poll, DateTrigger(run_date=next_run), id="live_poll", name="Task: live_poll",
+                          replace_existing=True)
+
 tasks = {
     "weekly": {
         "interval": 604800,  # Every week (in seconds)
-        "task": [ingest_teams_data, ingest_players_data, ingest_games_data]  # ADD WEEKLY TASKS HERE
+        "task": [weekly_refresh]  # ADD WEEKLY TASKS HERE
     }
 }
 
@@ -27,11 +95,12 @@ tasks = {
 def start_scheduler():
     print("***Starting Application***")
     
-    # Set up the database schemas
-    print("Setting up database schemas...")
-    setup_teams_table()
-    setup_players_table()
-    setup_games_table()
+    # Bring the database schema up to date (no DDL when it already is)
+    print("Checking database schema...")
+    run_migrations()
+    report_index_usage()
+    # Summaries queued by a migration or an interrupted run
+    refresh_summaries()
 
     # setup_schedules_table()
     # setup_final_scores_table() 
@@ -52,5 +121,27 @@ def start_scheduler():
                 print(f'Scheduled {task.__name__} every {task_info["interval"]} seconds!')
         else:
             print(f'Error: No tasks defined for {task_name}.')
+
+    if LIVE_POLLING_ENABLED:
+        scheduler.add_job(live_poll, DateTrigger(run_date=datetime.now()), id="live_poll", name="Task: live_poll",
+                          replace_existing=True)
+        print('Scheduled live_poll (adaptive game-day polling)!')
     
-    scheduler.start()
\ No newline at end of file
+    scheduler.start()
+
+@app.on_event("startup")
+async def open_api_db_pool():
+    # Registered after start_scheduler so the tables exist before the hot queries are prepared
+    await open_async_pool()
+    print("***Opened async database pool***")
+
+@app.on_event("shutdown")
+async def close_api_db_pool():
+    await close_async_pool()
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    print("***Stopping Application***")
+    scheduler.shutdown(wait=False)
+    close_engine()
+    close_pool()
\ No newline at end of file
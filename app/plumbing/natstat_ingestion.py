@@ -1,19 +1,27 @@
+import os
 import pandas as pd
-import requests, re
-import asyncio, logging, aiohttp, nest_asyncio
-from aiohttp import ClientSession
+import re
+from urllib.parse import urlsplit
+import asyncio, logging, aiohttp
 from typing import List, Dict
 from tqdm.asyncio import tqdm_asyncio  # Ensure tqdm is installed: pip install tqdm
+from services.async_ingestion import AsyncNatStatClient, AsyncBatchWriter, get_engine
+from services.natstat_client import INTERSTAT_BASE_URL, get_natstat_client
+from services.data_storage import STATLINE_COLUMNS, store_player_statlines_data
+from services.summaries import refresh_summaries
+from services.response_archive import get_response_archive, ReplayNatStatClient
 
-# Configure logging to write WARNING and above to a file
-logging.basicConfig(
-    filename='ingestion_pipelines.log',  # Log file name
-    filemode='a',  # Append mode
-    level=logging.DEBUG,  # Set to WARNING to suppress INFO and DEBUG messages
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
+# This module's log goes to its own file, whatever the importing process configured for the root logger
 logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Set to WARNING to suppress INFO and DEBUG messages
+if not logger.handlers:
+    _log_file = logging.FileHandler('ingestion_pipelines.log', mode='a')  # Append mode
+    _log_file.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.addHandler(_log_file)
+    logger.propagate = False
+
+# Statlines buffered before each COPY into player_statlines. Bounds peak memory of a statline run.
+STATLINE_BATCH_SIZE = int(os.getenv('STATLINE_BATCH_SIZE', '5000'))
 
 # Example log messages
 logger.debug("This DEBUG message will not be logged.")
@@ -23,16 +31,24 @@ logger.error("This ERROR message will be logged to the file.")
 logger.critical("This CRITICAL message will be logged to the file.")
 
 
-# Apply the nest_asyncio patch
-nest_asyncio.apply()
+def _on_base_url(api_url):
+    """The path and query of a NatStat meta apiurl (which names interst.at) on INTERSTAT_BASE_URL."""
+    parts = urlsplit(api_url)
+    return f"{INTERSTAT_BASE_URL}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+def _get_json(url, endpoint):
+    """
+    GETs an interst.at URL through the shared NatStat client, so 429s and network errors are retried, and
+    archives the raw body so the roster can be replayed later.
+    """
+    return get_natstat_client().get_json(url, endpoint)
 
-def ingest_teams_data():
+def ingest_teams_data(fetch_json=_get_json):
     """ Gets team data from the NatStat API and returns a DataFrame with team information.
+    fetch_json(url, endpoint) defaults to a live request; replays pass the response archive's get_json.
     """
-    url = f"https://interst.at/team/pfb/2024"
-    response = requests.get(url)
-    response.raise_for_status()
-    data = response.json()
+    url = f"{INTERSTAT_BASE_URL}/team/pfb/2024"
+    data = fetch_json(url, "rosters")
 
     # Extract the 'teams' dictionary
     teams_data = data['teams']
@@ -58,14 +74,12 @@ def ingest_teams_data():
 
     return teams_df
 
-def ingest_players_data(teams_df):
+def ingest_players_data(teams_df, fetch_json=_get_json):
     """Probably should add list of seasons for easy iteration later"""
     player_list = []
     for team in teams_df.itertuples():
-        url = f"https://interst.at/player/pfb/{team.code}"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        url = f"{INTERSTAT_BASE_URL}/player/pfb/{team.code}"
+        data = fetch_json(url, "rosters")
         players = data['players']
 
         for player_key, player_info in players.items():            
@@ -90,10 +104,8 @@ def ingest_games_data():
     Handles null values in the data.
     """
     # API endpoint for games
-    url = f"https://interst.at/game/pfb/2024"
-    response = requests.get(url)
-    response.raise_for_status()
-    data = response.json()
+    url = f"{INTERSTAT_BASE_URL}/game/pfb/2024"
+    data = _get_json(url, "rosters")
 
     # Extract the 'games' dictionary
     games_data = data.get('games', {})
@@ -138,9 +150,7 @@ def ingest_games_data():
 
 def parse_game_data(game_url):
     game_id = extract_game_code(game_url)
-    response = requests.get(game_url)
-    response.raise_for_status()
-    data = response.json()
+    data = _get_json(_on_base_url(game_url), "game")
 
     game = data['games'][f'game_{game_id}']
 
@@ -186,166 +196,240 @@ def extract_game_code(url):
     else:
         return None  # Return None if no game code is found
     
-async def fetch_player_data(session: ClientSession, player: pd.Series, semaphore: asyncio.Semaphore, season: int) -> List[Dict]:
+# Statline columns and the key path of each inside a NatStat 'playerstatline' entry. player_name/player_id
+# come from the player, not the statline, and are filled in by flatten_statlines.
+STATLINE_FIELDS = {
+    "statline_id": ('id',),
+    "player_name": None,
+    "player_id": None,
+    "position": ('position',),
+    "date": ('date',),
+    "season": ('season',),
+    "game_id": ('game', 'id'),
+    "team_id": ('team', 'id'),
+    "team_name": ('team', 'name'),
+    "opponent_id": ('opponent', 'id'),
+    "opponent_name": ('opponent', 'name'),
+    "pass_attempts": ('passatt',),
+    "pass_completions": ('passcomp',),
+    "pass_yards": ('passyds',),
+    "pass_yards_per_attempt": ('passypa',),
+    "passing_touchdowns": ('passtd',),
+    "interceptions_thrown": ('passint',),
+    "rush_attempts": ('rushatt',),
+    "rush_yards": ('rushyds',),
+    "rush_yards_per_attempt": ('rushypa',),
+    "rushing_touchdowns": ('rushtd',),
+    "longest_run": ('rushlong',),
+    "receptions": ('rec',),
+    "receiving_yards": ('recyds',),
+    "receiving_yards_per_reception": ('recypr',),
+    "receiving_touchdowns": ('rectd',),
+    "longest_reception": ('reclong',),
+    "fg_attempted": ('kickfga',),
+    "fg_made": ('kickfgm',),
+    "performance_score": ('perfscore',),
+    "performance_score_season_average": ('perfscoreseasonavg',),
+    "presence_rate": ('presencerate',),
+    "presence_rate_adjusted": ('adjpresencerate',),
+    "statline": ('statline',),
+}
+
+# Season-level PCR fields from the player's 'pcr' block. The block is per player, so it is read once and
+# broadcast to every statline.
+PCR_FIELDS = {
+    "pcr_season": 'season',
+    "pcr_efficiency": 'efficiency',
+    "pcr_efficiency_points": 'efficiencypoints',
+    "pcr_power": 'power',
+    "pcr_power_points": 'powerpoints',
+    "pcr_speed_agility": 'speedagility',
+    "pcr_speed_agility_points": 'speedagilitypoints',
+    "pcr_accuracy": 'accuracy',
+    "pcr_accuracy_points": 'accuracypoints',
+    "pcr_opponent_quality": 'oppquality',
+    "pcr_opponent_quality_points": 'oppqualitypoints',
+    "pcr_points": 'pcrpoints',
+    "pcr_points_adjusted": 'pcradjusted',
+    "pcr_rank": 'pcrrank',
+}
+
+STATLINE_DF_COLUMNS = list(STATLINE_FIELDS) + list(PCR_FIELDS)
+
+def _clean(value):
+    """NatStat sends {} or '' for missing values; both become None."""
+    if value == {} or value == '':
+        return None
+    return value
+
+def _column(statlines: List[Dict], path) -> List:
+    """Extracts one column from raw statlines by key path. Missing or non-dict intermediates yield None."""
+    if len(path) == 1:
+        key = path[0]
+        return [_clean(statline.get(key)) for statline in statlines]
+    column = []
+    for statline in statlines:
+        value = statline
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        column.append(_clean(value))
+    return column
+
+def flatten_statlines(player, statlines: List[Dict], pcr) -> Dict[str, List]:
+    """
+    Normalizes a player's raw statline dicts into column lists keyed by STATLINE_DF_COLUMNS. Each field is
+    extracted column-wise from the declared field maps; player and PCR values are computed once and broadcast.
+    """
+    rows = len(statlines)
+    columns = {}
+    for name, path in STATLINE_FIELDS.items():
+        if path is not None:
+            columns[name] = _column(statlines, path)
+    columns["player_name"] = [player.name] * rows
+    columns["player_id"] = [player.id] * rows
+
+    pcr = pcr if isinstance(pcr, dict) else {}
+    for name, key in PCR_FIELDS.items():
+        columns[name] = [_clean(pcr.get(key))] * rows
+    return {name: columns[name] for name in STATLINE_DF_COLUMNS}
+
+def rows_from_columns(columns: Dict[str, List], column_order: List[str]) -> List[tuple]:
+    """Transposes column lists into row tuples in column_order (e.g. for COPY)."""
+    if not columns:
+        return []
+    return list(zip(*(columns[name] for name in column_order)))
+
+async def fetch_player_data(client: AsyncNatStatClient, player: pd.Series, season: int) -> Dict[str, List]:
     """
     Asynchronously fetches and processes data for a single player.**Called from get_player_statlines_async**
+    Concurrency is bounded by the client's 'statlines' endpoint limit. Returns the player's statlines as
+    column lists (see flatten_statlines), or an empty dict if there is nothing to parse.
     TODO: get defensive season stats (seem to be more verbose)
     """
-    url = f"{player.api_url},{season}"
-    async with semaphore:
-        try:
-            async with session.get(url) as response:
-                response.raise_for_status()
-                data = await response.json()
-                logger.info(f"Parsing statistics for {player.name} at URL: {url}")
-
-                # Validate JSON structure
-                player_key = f'player_{player.id}'
-                if 'players' not in data or player_key not in data['players']:
-                    logger.error(f"Player data not found for {player.name} at URL: {url}")
-                    return []
-
-                player_data = data['players'][player_key]
-                if 'stats' not in player_data:
-                    logger.error(f"'stats' not found for {player.name} at URL: {url}")
-                    return []
-
-                stats = player_data['stats']
-
-                # Extract player_statlines
-                player_statlines = stats.get('playerstatline', {})
-                if not isinstance(player_statlines, dict):
-                    logger.error(f"'playerstatline' is not a dict for {player.name} at URL: {url}. Content: {player_statlines}")
-                    return []
-
-                # Initialize list to hold combined statlines for this player
-                statline_dicts = []
-
-                for key, value in player_statlines.items():
-                    if not isinstance(value, dict):
-                        logger.warning(f"Value for 'playerstatline' key '{key}' is not a dict for {player.name} at URL: {url}. Content: {value}")
-                        continue  # Skip this statline
-
-                    # Extract statline data
-                    statline_dict = {
-                        "statline_id": value.get('id'),
-                        "player_name": player.name,
-                        "player_id": player.id,
-                        "position": value.get('position'),
-                        "date": value.get('date'),
-                        "season": value.get('season'),
-                        "game_id": value.get('game', {}).get('id'),
-                        "team_id": value.get('team', {}).get('id'),
-                        "team_name": value.get('team', {}).get('name'),
-                        "opponent_id": value.get('opponent', {}).get('id'),
-                        "opponent_name": value.get('opponent', {}).get('name'),
-                        "pass_attempts": value.get('passatt'),
-                        "pass_completions": value.get('passcomp'),
-                        "pass_yards": value.get('passyds'),
-                        "pass_yards_per_attempt": value.get('passypa'),
-                        "passing_touchdowns": value.get('passtd'),
-                        "interceptions_thrown": value.get('passint'),
-                        "rush_attempts": value.get('rushatt'),
-                        "rush_yards": value.get('rushyds'),
-                        "rush_yards_per_attempt": value.get('rushypa'),
-                        "rushing_touchdowns": value.get('rushtd'),
-                        "longest_run": value.get('rushlong'),
-                        "receptions": value.get('rec'),
-                        "receiving_yards": value.get('recyds'),
-                        "receiving_yards_per_reception": value.get('recypr'),
-                        "receiving_touchdowns": value.get('rectd'),
-                        "longest_reception": value.get('reclong'),
-                        "fg_attempted": value.get('kickfga'),
-                        "fg_made": value.get('kickfgm'),
-                        "performance_score": value.get('perfscore'),
-                        "performance_score_season_average": value.get('perfscoreseasonavg'),
-                        "presence_rate": value.get('presencerate'),
-                        "presence_rate_adjusted": value.get('adjpresencerate'),
-                        "statline": value.get('statline'),
-                    }
-
-                    # Extract PCR Stats safely
-                    player_pcr_stats = stats.get('pcr', None)
-                    if isinstance(player_pcr_stats, dict):
-                        # PCR data exists; extract fields
-                        player_pcr_dict = {
-                            "pcr_season": player_pcr_stats.get('season'),
-                            "pcr_efficiency": player_pcr_stats.get('efficiency'),
-                            "pcr_efficiency_points": player_pcr_stats.get('efficiencypoints'),
-                            "pcr_power": player_pcr_stats.get('power'),
-                            "pcr_power_points": player_pcr_stats.get('powerpoints'),
-                            "pcr_speed_agility": player_pcr_stats.get('speedagility'),
-                            "pcr_speed_agility_points": player_pcr_stats.get('speedagilitypoints'),
-                            "pcr_accuracy": player_pcr_stats.get('accuracy'),
-                            "pcr_accuracy_points": player_pcr_stats.get('accuracypoints'),
-                            "pcr_opponent_quality": player_pcr_stats.get('oppquality'),
-                            "pcr_opponent_quality_points": player_pcr_stats.get('oppqualitypoints'),
-                            "pcr_points": player_pcr_stats.get('pcrpoints'),
-                            "pcr_points_adjusted": player_pcr_stats.get('pcradjusted'),
-                            "pcr_rank": player_pcr_stats.get('pcrrank')
-                        }
-                    else:
-                        # PCR data does not exist; assign None to all PCR fields
-                        player_pcr_dict = {
-                            "pcr_season": None,
-                            "pcr_efficiency": None,
-                            "pcr_efficiency_points": None,
-                            "pcr_power": None,
-                            "pcr_power_points": None,
-                            "pcr_speed_agility": None,
-                            "pcr_speed_agility_points": None,
-                            "pcr_accuracy": None,
-                            "pcr_accuracy_points": None,
-                            "pcr_opponent_quality": None,
-                            "pcr_opponent_quality_points": None,
-                            "pcr_points": None,
-                            "pcr_points_adjusted": None,
-                            "pcr_rank": None
-                        }
-
-                    # Combine Dictionaries
-                    combined_dict = {**statline_dict, **player_pcr_dict}
-                    statline_dicts.append(combined_dict)
-
-                return statline_dicts
-
-        except aiohttp.ClientResponseError as e:
-            logger.error(f"HTTP error for player {player.name} at URL: {url}. Status: {e.status}. Message: {e.message}")
-            return []
-        except aiohttp.ClientError as e:
-            logger.error(f"Network error for player {player.name} at URL: {url}. Error: {e}")
-            return []
-        except Exception as e:
-            logger.error(f"Unexpected error for player {player.name} at URL: {url}. Error: {e}")
-            return []
-
-
-async def get_player_statlines_async(players_df: pd.DataFrame, seasons=[2024]) -> pd.DataFrame:
+    url = _on_base_url(f"{player.api_url},{season}")
+    try:
+        data = await client.get_json(url, endpoint="statlines")
+        logger.info(f"Parsing statistics for {player.name} at URL: {url}")
+
+        # Validate JSON structure
+        player_key = f'player_{player.id}'
+        if 'players' not in data or player_key not in data['players']:
+            logger.error(f"Player data not found for {player.name} at URL: {url}")
+            return {}
+
+        player_data = data['players'][player_key]
+        if 'stats' not in player_data:
+            logger.error(f"'stats' not found for {player.name} at URL: {url}")
+            return {}
+
+        stats = player_data['stats']
+
+        # Extract player_statlines
+        player_statlines = stats.get('playerstatline', {})
+        if not isinstance(player_statlines, dict):
+            logger.error(f"'playerstatline' is not a dict for {player.name} at URL: {url}. Content: {player_statlines}")
+            return {}
+
+        raw_statlines = []
+        for key, value in player_statlines.items():
+            if not isinstance(value, dict):
+                logger.warning(f"Value for 'playerstatline' key '{key}' is not a dict for {player.name} at URL: {url}. Content: {value}")
+                continue  # Skip this statline
+            raw_statlines.append(value)
+
+        return flatten_statlines(player, raw_statlines, stats.get('pcr'))
+
+    except aiohttp.ClientResponseError as e:
+        logger.error(f"HTTP error for player {player.name} at URL: {url}. Status: {e.status}. Message: {e.message}")
+        return {}
+    except aiohttp.ClientError as e:
+        logger.error(f"Network error for player {player.name} at URL: {url}. Error: {e}")
+        return {}
+    except Exception as e:
+        logger.error(f"Unexpected error for player {player.name} at URL: {url}. Error: {e}")
+        return {}
+
+
+async def get_player_statlines_async(players_df: pd.DataFrame, seasons=[2024], client: AsyncNatStatClient = None,
+                                     writer: AsyncBatchWriter = None) -> pd.DataFrame:
     """
     Asynchronously fetches and compiles player statlines into a DataFrame.**Called from get_player_statlines**
+    Uses the shared ingestion engine's client unless one is passed in. With a writer, each player's statlines
+    are handed to it as STATLINE_COLUMNS-ordered row tuples as soon as they complete and nothing is
+    accumulated; returns None in that case.
     """
-    player_stat_list: List[Dict] = []
-    semaphore = asyncio.Semaphore(100)  # Limit concurrent requests to 100
-
-    connector = aiohttp.TCPConnector(limit=100)  # Adjust limit as needed
-    async with aiohttp.ClientSession(connector=connector) as session:
-        tasks = [
-            fetch_player_data(session, player, semaphore, season)
-            for player in players_df.itertuples(index=False)
-            for season in seasons
-        ]
-
-        # Using tqdm for progress bar (optional)
-        for coroutine in tqdm_asyncio.as_completed(tasks, total=len(tasks), desc="Processing Players"):
-            result = await coroutine
-            player_stat_list.extend(result)
-
-    # Create DataFrame from list of dictionaries
-    players_df_result = pd.DataFrame(player_stat_list)
+    client = client or get_engine().client
+    player_stat_columns: Dict[str, List] = {name: [] for name in STATLINE_DF_COLUMNS}
+
+    tasks = [
+        fetch_player_data(client, player, season)
+        for player in players_df.itertuples(index=False)
+        for season in seasons
+    ]
+
+    # Using tqdm for progress bar (optional)
+    for coroutine in tqdm_asyncio.as_completed(tasks, total=len(tasks), desc="Processing Players"):
+        result = await coroutine
+        if not result:
+            continue
+        if writer is not None:
+            await writer.add(rows_from_columns(result, STATLINE_COLUMNS))
+        else:
+            for name, values in result.items():
+                player_stat_columns[name].extend(values)
+
+    if writer is not None:
+        await writer.flush()
+        return None
+
+    # Build the DataFrame straight from the column lists
+    players_df_result = pd.DataFrame(player_stat_columns, columns=STATLINE_DF_COLUMNS)
     return players_df_result
 
 def get_player_statlines(players_df: pd.DataFrame, seasons=[2024]) -> pd.DataFrame:
     """
-    Synchronous wrapper to execute the asynchronous statline fetching. NOTE: Unsure if season param does anything 
+    Synchronous wrapper that runs the statline fetch on the shared ingestion engine's event loop, so it also
+    works from notebooks that already have a running loop. NOTE: Unsure if season param does anything 
+    """
+    engine = get_engine()
+    return engine.run(get_player_statlines_async(players_df, seasons, engine.client))
+
+async def ingest_player_statlines_async(client: AsyncNatStatClient, seasons=[2024], batch_size=STATLINE_BATCH_SIZE,
+                                        fetch_json=_get_json):
+    """
+    Fetches every player's statlines and streams them into the 'player_statlines' table in batches of
+    batch_size, so peak memory is bounded by one batch rather than every statline of the run.
+    """
+    teams_df = await asyncio.to_thread(ingest_teams_data, fetch_json)
+    players_df = await asyncio.to_thread(ingest_players_data, teams_df, fetch_json)
+
+    writer = AsyncBatchWriter(store_player_statlines_data, batch_size)
+    await get_player_statlines_async(players_df, seasons, client, writer)
+    totals = writer.totals
+    print(f"player_statlines: {totals['inserted']} inserted, {totals['updated']} updated, {totals['unchanged']} unchanged")
+    return totals
+
+def ingest_player_statlines(seasons=[2024], refresh=True):
+    """
+    Synchronous entry point: persists statlines for all players to Postgres, then (unless refresh=False, as
+    in the weekly job graph, which refreshes summaries as its own stage) refreshes the season summaries of the
+    players whose statlines changed. Returns the row counts.
+    """
+    engine = get_engine()
+    totals = engine.run(ingest_player_statlines_async(engine.client, seasons))
+    if refresh:
+        refresh_summaries()
+    return totals
+
+def replay_player_statlines(seasons=[2024]):
+    """
+    Re-parses and re-stores statlines from the response archive instead of NatStat: the rosters and every
+    player's statline response are read from disk. Players missing from the archive are logged and skipped.
+    Returns the row counts.
     """
-    return asyncio.run(get_player_statlines_async(players_df, seasons))
\ No newline at end of file
+    archive = get_response_archive()
+    engine = get_engine()
+    totals = engine.run(ingest_player_statlines_async(ReplayNatStatClient(archive), seasons,
+                                                      fetch_json=archive.get_json))
+    refresh_summaries()
+    return totals
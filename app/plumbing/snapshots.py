@@ -0,0 +1,84 @@
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Snapshots live next to the notebooks that read them. Override with SNAPSHOT_DIR.
+SNAPSHOT_DIR = os.getenv(
+    'SNAPSHOT_DIR',
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'notebooks', 'dataframes'))
+)
+
+# Hive-style partition columns per snapshot. Reads filtering on these skip whole directories.
+SNAPSHOT_PARTITIONS = {
+    "player_statlines": ["season", "position"],
+}
+
+def _snapshot_path(name, root=None, suffix=""):
+    return os.path.join(root or SNAPSHOT_DIR, f"{name}{suffix}")
+
+def _normalize_objects(df):
+    """
+    NatStat sends an empty {} where a text field has no value; Arrow needs one type per column,
+    so empty containers become None.
+    """
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].map(lambda v: None if isinstance(v, (dict, list)) and not v else v)
+    return df
+
+def write_snapshot(df: pd.DataFrame, name: str, partition_cols=None, root=None) -> str:
+    """
+    Writes a DataFrame as a Parquet dataset under <root>/<name>/, replacing any previous snapshot of that name.
+    partition_cols defaults to SNAPSHOT_PARTITIONS[name]; snapshots without partitions are a single file.
+    Returns the dataset path.
+    """
+    partition_cols = SNAPSHOT_PARTITIONS.get(name, []) if partition_cols is None else partition_cols
+    path = _snapshot_path(name, root)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    table = pa.Table.from_pandas(_normalize_objects(df), preserve_index=False)
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=partition_cols or None,
+        partitioning_flavor="hive" if partition_cols else None,
+        basename_template="part-{i}.parquet",
+    )
+    return path
+
+def read_snapshot(name: str, columns=None, filters=None, root=None) -> pd.DataFrame:
+    """
+    Loads a Parquet snapshot, reading only the requested columns and only the row groups/partitions that can
+    match filters. filters takes a pyarrow expression or pandas-style tuples, e.g. [('position', '=', 'WR')].
+    Partition columns come back with inferred types, so season is an integer.
+    """
+    dataset = ds.dataset(_snapshot_path(name, root), format="parquet", partitioning="hive")
+    if filters is not None and not isinstance(filters, ds.Expression):
+        filters = pq.filters_to_expression(filters)
+    return dataset.to_table(columns=columns, filter=filters).to_pandas()
+
+def export_arrow(name: str, root=None) -> str:
+    """
+    Writes an uncompressed Arrow IPC copy of a Parquet snapshot to <root>/<name>.arrow for memory-mapped loading.
+    Returns the file path.
+    """
+    table = ds.dataset(_snapshot_path(name, root), format="parquet", partitioning="hive").to_table()
+    path = _snapshot_path(name, root, ".arrow")
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+def load_arrow(name: str, columns=None, root=None) -> pa.Table:
+    """
+    Memory-maps <root>/<name>.arrow and returns it as a pyarrow Table without copying the data into memory.
+    Convert with .to_pandas() once the projection/filtering is done.
+    """
+    source = pa.memory_map(_snapshot_path(name, root, ".arrow"), "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
@@ -0,0 +1,113 @@
+import os
+import time
+from contextlib import asynccontextmanager
+import asyncpg
+from dotenv import load_dotenv
+from .metrics import DB_POOL_WAIT_SECONDS
+
+load_dotenv()
+
+DB_ASYNC_POOL_MIN_SIZE = int(os.getenv('DB_ASYNC_POOL_MIN_SIZE', '2'))
+DB_ASYNC_POOL_MAX_SIZE = int(os.getenv('DB_ASYNC_POOL_MAX_SIZE', '20'))
+DB_ASYNC_COMMAND_TIMEOUT = float(os.getenv('DB_ASYNC_COMMAND_TIMEOUT', '10'))  # Seconds per query
+
+# Hot API queries. asyncpg prepares each one in the connection's statement cache on its first fetch and reuses
+# it after that, so repeat requests skip parse/plan. Optional filters are passed as NULL.
+PREPARED_QUERIES = {
+    "teams": 'SELECT "Code", "Name", "Location" FROM teams ORDER BY "Code"',
+    "team": 'SELECT "Code", "Name", "Location" FROM teams WHERE "Code" = $1',
+    "players": """
+        SELECT "Code", "Name", "Team", "TeamCode" FROM players
+        WHERE ($1::text IS NULL OR "TeamCode" = $1)
+        ORDER BY "Code" LIMIT $2 OFFSET $3
+    """,
+    "player": 'SELECT "Code", "Name", "Team", "TeamCode" FROM players WHERE "Code" = $1',
+    "games": """
+        SELECT game_id, visitor, visitor_code, score_vis, home, home_code, score_home, gamestatus, overtime,
+               winner_code, loser_code, gameday, gameno, venue, venue_code
+        FROM games
+        WHERE ($1::date IS NULL OR gameday >= $1)
+          AND ($2::date IS NULL OR gameday <= $2)
+          AND ($3::text IS NULL OR home_code = $3 OR visitor_code = $3)
+          AND ($4::text IS NULL OR gamestatus ILIKE $4)
+        ORDER BY gameday, gameno LIMIT $5 OFFSET $6
+    """,
+    "game": """
+        SELECT game_id, visitor, visitor_code, score_vis, home, home_code, score_home, gamestatus, overtime,
+               winner_code, loser_code, gameday, gameno, venue, venue_code
+        FROM games WHERE game_id = $1
+    """,
+    "team_summaries": """
+        SELECT team_code, season, games, wins, losses, ties, points_for, points_against,
+               points_for_per_game, points_against_per_game, refreshed_at
+        FROM team_season_summaries
+        WHERE ($1::int IS NULL OR season = $1)
+          AND ($2::text IS NULL OR team_code = $2)
+        ORDER BY season DESC, wins DESC, team_code
+    """,
+    "player_summaries": """
+        SELECT player_id, season, player_name, position, team_id, team_name, games,
+               pass_attempts, pass_completions, pass_yards, passing_touchdowns, interceptions_thrown,
+               rush_attempts, rush_yards, rushing_touchdowns, receptions, receiving_yards, receiving_touchdowns,
+               fg_attempted, fg_made, pass_yards_per_game, rush_yards_per_game, receiving_yards_per_game,
+               avg_performance_score, refreshed_at
+        FROM player_season_summaries
+        WHERE ($1::int IS NULL OR season = $1)
+          AND ($2::text IS NULL OR position = $2)
+          AND ($3::text IS NULL OR player_id = $3)
+        ORDER BY season DESC, avg_performance_score DESC NULLS LAST, player_id LIMIT $4 OFFSET $5
+    """,
+}
+
+_pool = None
+
+async def open_async_pool():
+    """Creates the process-wide asyncpg pool. Called from the FastAPI startup hook."""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            host=os.getenv('DB_HOST'),
+            database=os.getenv('DB_NAME'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            port=os.getenv('DB_PORT', '5432'),
+            min_size=DB_ASYNC_POOL_MIN_SIZE,
+            max_size=DB_ASYNC_POOL_MAX_SIZE,
+            command_timeout=DB_ASYNC_COMMAND_TIMEOUT,
+        )
+    return _pool
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+def get_async_pool():
+    if _pool is None:
+        raise RuntimeError("Async database pool is not open; open_async_pool() runs on application startup")
+    return _pool
+
+@asynccontextmanager
+async def _acquire():
+    """Checks out a pooled connection, recording the checkout wait."""
+    started = time.perf_counter()
+    async with get_async_pool().acquire() as conn:
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, pool="asyncpg")
+        yield conn
+
+async def fetch_prepared(name, *args):
+    """Runs one of PREPARED_QUERIES and returns the rows as dicts."""
+    async with _acquire() as conn:
+        return [dict(row) for row in await conn.fetch(PREPARED_QUERIES[name], *args)]
+
+async def fetchrow_prepared(name, *args):
+    """Runs one of PREPARED_QUERIES and returns the first row as a dict, or None."""
+    async with _acquire() as conn:
+        row = await conn.fetchrow(PREPARED_QUERIES[name], *args)
+        return dict(row) if row is not None else None
+
+async def fetch(query, *args):
+    """Runs an ad-hoc query (still cached per connection by asyncpg) and returns the rows as dicts."""
+    async with _acquire() as conn:
+        return [dict(row) for row in await conn.fetch(query, *args)]
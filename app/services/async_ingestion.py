@@ -0,0 +1,245 @@
+import os
+import hashlib
+import asyncio
+import time
+import threading
+from urllib.parse import urlparse
+import aiohttp
+from dotenv import load_dotenv
+from .natstat_client import (
+    NATSTAT_MAX_RETRIES,
+    NATSTAT_TIMEOUT,
+    NATSTAT_POOL_SIZE,
+    NATSTAT_RATE_LIMITED_HOSTS,
+    RETRY_STATUSES,
+    backoff_delay,
+    parse_retry_after,
+    get_natstat_client
+)
+from .response_archive import archive_response
+from .metrics import NATSTAT_DECODE_SECONDS
+from .json_codec import loads
+
+load_dotenv()
+
+# Concurrent in-flight requests per endpoint. NATSTAT_CONCURRENCY is the default for endpoints not listed here.
+NATSTAT_CONCURRENCY = int(os.getenv('NATSTAT_CONCURRENCY', '4'))
+ENDPOINT_CONCURRENCY = {
+    "teams": int(os.getenv('NATSTAT_TEAMS_CONCURRENCY', '1')),
+    "players": int(os.getenv('NATSTAT_PLAYERS_CONCURRENCY', '2')),
+    "games": int(os.getenv('NATSTAT_GAMES_CONCURRENCY', '2')),
+    "statlines": int(os.getenv('NATSTAT_STATLINES_CONCURRENCY', '100')),
+}
+# Total connections the shared aiohttp session keeps open across all endpoints
+NATSTAT_ASYNC_POOL_SIZE = int(os.getenv('NATSTAT_ASYNC_POOL_SIZE', str(max(NATSTAT_POOL_SIZE, 100))))
+
+class AsyncNatStatClient:
+    """
+    asyncio counterpart of NatStatClient. One aiohttp.ClientSession serves every endpoint, each endpoint is
+    limited by its own semaphore, and rate limiting, retries and stats are shared with the sync client so the
+    whole process stays within one NatStat budget.
+    """
+
+    def __init__(self, bucket, stats, max_retries=NATSTAT_MAX_RETRIES, timeout=NATSTAT_TIMEOUT,
+                 pool_size=NATSTAT_ASYNC_POOL_SIZE, concurrency=None):
+        self.bucket = bucket
+        self.stats = stats
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.concurrency = dict(ENDPOINT_CONCURRENCY, **(concurrency or {}))
+        self._semaphores = {}
+        self._session = None
+
+    @property
+    def session(self):
+        """The shared ClientSession. Created on first use so it binds to the engine's event loop."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    def semaphore(self, endpoint):
+        if endpoint not in self._semaphores:
+            self._semaphores[endpoint] = asyncio.Semaphore(self.concurrency.get(endpoint, NATSTAT_CONCURRENCY))
+        return self._semaphores[endpoint]
+
+    async def _throttle(self, url):
+        if urlparse(url).hostname in NATSTAT_RATE_LIMITED_HOSTS:
+            delay = self.bucket.reserve()
+            self.stats.incr("rate_limit_wait_seconds", delay)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def _fetch(self, url, endpoint, headers=None):
+        """
+        GETs a URL, holding the endpoint's semaphore for the whole attempt sequence, and returns
+        (status, headers, body). Raises aiohttp.ClientResponseError once retries are exhausted.
+        """
+        async with self.semaphore(endpoint):
+            attempt = 0
+            while True:
+                await self._throttle(url)
+                self.stats.incr("requests")
+                retry_after = None
+                started = time.perf_counter()
+                try:
+                    async with self.session.get(url, headers=headers) as response:
+                        if response.status not in RETRY_STATUSES:
+                            if response.status >= 400:
+                                self.stats.observe_latency(time.perf_counter() - started, endpoint, response.status)
+                                self.stats.incr("failures")
+                            response.raise_for_status()
+                            body = await response.read()
+                            self.stats.observe_latency(time.perf_counter() - started, endpoint, response.status)
+                            return response.status, response.headers, body
+
+                        self.stats.observe_latency(time.perf_counter() - started, endpoint, response.status)
+
+                        self.stats.incr("throttled" if response.status == 429 else "server_errors")
+                        if attempt >= self.max_retries:
+                            self.stats.incr("failures")
+                            response.raise_for_status()
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        error = f"HTTP {response.status}"
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    self.stats.observe_latency(time.perf_counter() - started, endpoint)
+                    self.stats.incr("network_errors")
+                    if attempt >= self.max_retries:
+                        self.stats.incr("failures")
+                        raise
+                    error = e
+
+                delay = backoff_delay(attempt, retry_after)
+                print(f"NatStat request failed ({error}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                self.stats.incr("retries")
+                self.stats.incr("backoff_wait_seconds", delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def get_json(self, url, endpoint="default"):
+        """
+        GETs a URL and decodes the JSON body. Successful raw bodies go to the response archive.
+        Raises aiohttp.ClientResponseError once retries are exhausted.
+        """
+        status, headers, body = await self._fetch(url, endpoint)
+        await asyncio.to_thread(archive_response, url, endpoint, body)
+        with NATSTAT_DECODE_SECONDS.time(endpoint=endpoint):
+            return loads(body)
+
+    async def get_json_if_changed(self, url, endpoint="default", validator=None):
+        """
+        Conditional GET. validator is the one stored for url (see services.http_validators) or None. Sends
+        If-None-Match / If-Modified-Since and returns (data, new_validator); data is None, and the body is
+        not parsed, when the server answers 304 or returns a body with the stored hash. The caller saves
+        new_validator only once the page has been stored, so a failed write is retried on the next run.
+        """
+        validator = validator or {}
+        headers = {}
+        if validator.get("etag"):
+            headers["If-None-Match"] = validator["etag"]
+        if validator.get("last_modified"):
+            headers["If-Modified-Since"] = validator["last_modified"]
+
+        status, response_headers, body = await self._fetch(url, endpoint, headers)
+        if status == 304:
+            self.stats.incr("not_modified")
+            return None, dict(validator)
+
+        body_sha256 = hashlib.sha256(body).hexdigest()
+        new_validator = dict(validator, etag=response_headers.get("ETag"),
+                             last_modified=response_headers.get("Last-Modified"), body_sha256=body_sha256)
+        if body_sha256 == validator.get("body_sha256"):
+            self.stats.incr("unchanged_bodies")
+            return None, new_validator
+        await asyncio.to_thread(archive_response, url, endpoint, body)
+        with NATSTAT_DECODE_SECONDS.time(endpoint=endpoint):
+            return loads(body), new_validator
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+class AsyncBatchWriter:
+    """
+    Buffers records produced on the event loop and hands them to a blocking store_fn on a worker thread
+    whenever batch_size records are pending, so memory is bounded by the batch size rather than the run.
+    Flushes are serialized; add() waits for the previous flush before starting the next one.
+    """
+
+    def __init__(self, store_fn, batch_size):
+        self.store_fn = store_fn
+        self.batch_size = batch_size
+        self.totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+        self._pending = []
+        self._lock = asyncio.Lock()
+
+    async def add(self, records):
+        self._pending.extend(records)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            counts = await asyncio.to_thread(self.store_fn, batch) or {}
+            for field in self.totals:
+                self.totals[field] += counts.get(field, 0)
+
+class IngestionEngine:
+    """
+    Owns one asyncio event loop on a dedicated thread and the AsyncNatStatClient bound to it. Synchronous
+    callers (scheduler jobs, notebooks, scripts) submit coroutines with run(); because the loop never runs on
+    the caller's thread this works even where a loop is already running, without nest_asyncio.
+    """
+
+    def __init__(self, client=None):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="natstat-ingestion-loop", daemon=True)
+        self._thread.start()
+        if client is None:
+            sync_client = get_natstat_client()
+            client = AsyncNatStatClient(sync_client.bucket, sync_client.stats)
+        self.client = client
+
+    @property
+    def closed(self):
+        return self._loop.is_closed()
+
+    def run(self, coro):
+        """Runs a coroutine on the engine's loop and blocks until it returns (or re-raises its exception)."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("IngestionEngine.run() called from the engine's own loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self):
+        """Closes the HTTP session and stops the loop thread."""
+        if self.closed:
+            return
+        asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Returns the process-wide ingestion engine, creating it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None or _engine.closed:
+            _engine = IngestionEngine()
+        return _engine
+
+def close_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+            _engine = None
@@ -0,0 +1,227 @@
+import io
+import os
+import json
+import time
+import hashlib
+import logging
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+from .metrics import record_upsert
+
+logger = logging.getLogger(__name__)
+
+# Rows per multi-row INSERT statement. Override with UPSERT_BATCH_SIZE in .env
+UPSERT_BATCH_SIZE = int(os.getenv('UPSERT_BATCH_SIZE', '1000'))
+
+def chunked(records, batch_size):
+    """Yields lists of at most batch_size records from any iterable."""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def dedupe_on_conflict_key(batch, conflict_columns):
+    """
+    Keeps the last record for each conflict key. Postgres rejects an INSERT ... ON CONFLICT DO UPDATE
+    that touches the same row twice in one statement.
+    """
+    deduped = {}
+    for record in batch:
+        deduped[tuple(record[col] for col in conflict_columns)] = record
+    return list(deduped.values())
+
+def hash_values(values):
+    """
+    MD5 of a normalized row: the values, in order, serialized as JSON. Dates and other non-JSON types
+    go through str(), so the same API payload always hashes the same.
+    """
+    normalized = json.dumps(list(values), default=str, separators=(',', ':'))
+    return hashlib.md5(normalized.encode('utf-8')).hexdigest()
+
+def row_hash(record, columns):
+    """hash_values() of a record dict's columns, in order."""
+    return hash_values(record[col] for col in columns)
+
+def _flag_inserted(table, conflict_columns, upsert, returning):
+    """
+    Wraps an upsert that returns its conflict key in a statement yielding (inserted, *returning) per written row.
+    The outer SELECT sees the table as it was before the upsert, so a key with no earlier row was inserted.
+    """
+    return sql.SQL(
+        "WITH written AS ({upsert}) "
+        "SELECT NOT EXISTS (SELECT 1 FROM {table} existing WHERE {match}) AS inserted{returning} FROM written"
+    ).format(
+        upsert=upsert,
+        table=sql.Identifier(table),
+        returning=sql.SQL('').join(sql.SQL(", written.{col}").format(col=sql.Identifier(col)) for col in returning),
+        match=sql.SQL(' AND ').join(
+            sql.SQL("existing.{col} = written.{col}").format(col=sql.Identifier(col)) for col in conflict_columns
+        ),
+    )
+
+def build_upsert_query(table, columns, conflict_columns, update_columns=None, hash_column=None, source=None,
+                       returning=()):
+    """
+    Builds an INSERT ... VALUES %s ON CONFLICT statement for use with execute_values, or
+    INSERT ... <source> ON CONFLICT when source (a sql.Composable such as a SELECT) is given.
+    update_columns defaults to every non-key column; an empty list means DO NOTHING.
+    With hash_column set, a conflicting row is only rewritten when its stored hash differs.
+    Yields one (inserted, *returning) row per inserted or updated row, so unchanged rows return nothing.
+    inserted is worked out against the statement's snapshot rather than xmax, which partitioned tables do not expose.
+    """
+    if update_columns is None:
+        update_columns = [col for col in columns if col not in conflict_columns]
+
+    insert = sql.SQL("INSERT INTO {table} ({columns}) {source} ON CONFLICT ({conflict}) ").format(
+        table=sql.Identifier(table),
+        columns=sql.SQL(', ').join(map(sql.Identifier, columns)),
+        source=source if source is not None else sql.SQL("VALUES %s"),
+        conflict=sql.SQL(', ').join(map(sql.Identifier, conflict_columns)),
+    )
+    returned = list(conflict_columns) + [col for col in returning if col not in conflict_columns]
+    returning_clause = sql.SQL(" RETURNING {columns}").format(
+        columns=sql.SQL(', ').join(map(sql.Identifier, returned))
+    )
+    if not update_columns:
+        return _flag_inserted(table, conflict_columns, insert + sql.SQL("DO NOTHING") + returning_clause, returning)
+
+    assignments = sql.SQL(', ').join(
+        sql.SQL("{col} = EXCLUDED.{col}").format(col=sql.Identifier(col)) for col in update_columns
+    )
+    query = insert + sql.SQL("DO UPDATE SET ") + assignments
+    if hash_column:
+        query += sql.SQL(" WHERE {table}.{hash} IS DISTINCT FROM EXCLUDED.{hash}").format(
+            table=sql.Identifier(table), hash=sql.Identifier(hash_column)
+        )
+    return _flag_inserted(table, conflict_columns, query + returning_clause, returning)
+
+def bulk_upsert(cursor, table, columns, conflict_columns, records, update_columns=None, batch_size=None,
+                hash_column=None, returning=None):
+    """
+    Upserts an iterable of record dicts into a table, sending one multi-row INSERT ... ON CONFLICT
+    per batch instead of one round trip per row. Does not commit; the caller owns the transaction.
+    With hash_column, each record gets a row_hash() of its columns and rows whose stored hash matches are
+    left untouched, so an unchanged row costs no dead tuple or WAL.
+
+    Args:
+        cursor: An open psycopg2 cursor.
+        table (str): Target table name.
+        columns (list of str): Columns to insert, in order. Every record must have these keys.
+        conflict_columns (list of str): Columns of the unique constraint used for ON CONFLICT.
+        records (iterable of dict): Rows to write.
+        update_columns (list of str, optional): Columns to overwrite on conflict.
+        batch_size (int, optional): Rows per statement. Defaults to UPSERT_BATCH_SIZE.
+        hash_column (str, optional): Content-hash column used to skip updates of unchanged rows.
+        returning (list of str, optional): Columns to report for every inserted or updated row.
+
+    Returns:
+        dict: Counts of rows sent to the database and of rows inserted, updated and left unchanged. With
+        returning, 'changed' also lists a tuple of those columns per inserted or updated row.
+    """
+    batch_size = batch_size or UPSERT_BATCH_SIZE
+    if update_columns is None:
+        update_columns = [col for col in columns if col not in conflict_columns]
+    hashed_columns = columns
+    if hash_column:
+        columns = columns + [hash_column]
+        update_columns = update_columns + [hash_column]
+    query = build_upsert_query(table, columns, conflict_columns, update_columns, hash_column, returning=returning or ())
+
+    counts = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+    if returning:
+        counts["changed"] = []
+    for batch_no, batch in enumerate(chunked(records, batch_size), start=1):
+        batch = dedupe_on_conflict_key(batch, conflict_columns)
+        if hash_column:
+            batch = [dict(record, **{hash_column: row_hash(record, hashed_columns)}) for record in batch]
+        values = [tuple(record[col] for col in columns) for record in batch]
+
+        started = time.perf_counter()
+        written = execute_values(cursor, query, values, page_size=len(values), fetch=True)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        inserted = sum(1 for row in written if row[0])
+        record_upsert(table, "values", elapsed_ms / 1000, {"inserted": inserted, "updated": len(written) - inserted,
+                                                          "unchanged": len(values) - len(written)})
+        if returning:
+            counts["changed"].extend(tuple(row[1:]) for row in written)
+        counts["rows"] += len(values)
+        counts["inserted"] += inserted
+        counts["updated"] += len(written) - inserted
+        counts["unchanged"] += len(values) - len(written)
+        logger.info(f"Upserted batch {batch_no} of {len(values)} rows into '{table}' in {elapsed_ms:.1f} ms "
+                    f"({inserted} inserted, {len(written) - inserted} updated, {len(values) - len(written)} unchanged)")
+
+    return counts
+
+def _copy_text_value(value):
+    """Formats one value for COPY ... FROM STDIN in text format."""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def copy_upsert(cursor, table, columns, conflict_columns, rows, update_columns=None, hash_column=None,
+                returning=None):
+    """
+    Upserts a batch of row tuples (values in columns order) by streaming them with COPY into a temporary
+    staging table and merging that into the target with one INSERT ... SELECT ... ON CONFLICT. Faster than
+    bulk_upsert for large batches; the whole batch is held in memory, so callers bound it. Does not commit.
+
+    Returns:
+        dict: Counts of rows sent to the database and of rows inserted, updated and left unchanged. With
+        returning, 'changed' also lists a tuple of those columns per inserted or updated row.
+    """
+    if update_columns is None:
+        update_columns = [col for col in columns if col not in conflict_columns]
+
+    # Keep the last row per conflict key; one INSERT ... ON CONFLICT may not touch a row twice
+    key_positions = [columns.index(col) for col in conflict_columns]
+    rows = list({tuple(row[i] for i in key_positions): row for row in rows}.values())
+    if hash_column:
+        columns = columns + [hash_column]
+        update_columns = update_columns + [hash_column]
+        rows = [tuple(row) + (hash_values(row),) for row in rows]
+
+    counts = {"rows": len(rows), "inserted": 0, "updated": 0, "unchanged": 0}
+    if returning:
+        counts["changed"] = []
+    if not rows:
+        return counts
+
+    staging = sql.Identifier(f"_staging_{table}")
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    cursor.execute(sql.SQL("CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DROP AS "
+                           "SELECT {columns} FROM {table} WITH NO DATA").format(
+        staging=staging, columns=column_list, table=sql.Identifier(table)
+    ))
+    cursor.execute(sql.SQL("TRUNCATE {staging}").format(staging=staging))
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(map(_copy_text_value, row)))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    started = time.perf_counter()
+    cursor.copy_expert(sql.SQL("COPY {staging} ({columns}) FROM STDIN").format(staging=staging, columns=column_list),
+                       buffer)
+    source = sql.SQL("SELECT {columns} FROM {staging}").format(columns=column_list, staging=staging)
+    cursor.execute(build_upsert_query(table, columns, conflict_columns, update_columns, hash_column, source,
+                                      returning or ()))
+    written = cursor.fetchall()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    counts["inserted"] = sum(1 for row in written if row[0])
+    if returning:
+        counts["changed"] = [tuple(row[1:]) for row in written]
+    counts["updated"] = len(written) - counts["inserted"]
+    counts["unchanged"] = len(rows) - len(written)
+    record_upsert(table, "copy", elapsed_ms / 1000, counts)
+    logger.info(f"Copied {len(rows)} rows into '{table}' in {elapsed_ms:.1f} ms ({counts['inserted']} inserted, "
+                f"{counts['updated']} updated, {counts['unchanged']} unchanged)")
+    return counts
@@ -1,108 +1,273 @@
-import requests
 import os
 from dotenv import load_dotenv
-import time  # For handling rate limits if necessary
+import asyncio
+from datetime import date, timedelta
+from .async_ingestion import get_engine
+from .natstat_client import NATSTAT_BASE_URL
 from .data_storage import (
     store_teams_data,
     store_players_data,
-    store_games_data
+    store_games_data,
+    get_watermark,
+    set_watermark,
+    compute_games_watermark
 )
+from .summaries import refresh_summaries
+from .response_archive import get_response_archive
+from .http_validators import get_validator_store
 
 load_dotenv()
 NATSTAT_API = os.getenv('NATSTAT_API')
+# Pages the fetcher may download ahead of the writer. 0 disables pipelining.
+NATSTAT_PREFETCH_PAGES = int(os.getenv('NATSTAT_PREFETCH_PAGES', '2'))
 
-def ingest_teams_data():
+# Incremental games ingestion: re-request this many days before the watermark to pick up score corrections
+NATSTAT_GAMES_LOOKBACK_DAYS = int(os.getenv('NATSTAT_GAMES_LOOKBACK_DAYS', '14'))
+NATSTAT_GAMES_FULL_BACKFILL = os.getenv('NATSTAT_GAMES_FULL_BACKFILL', '0') == '1'
+GAMES_BACKFILL_START = date(2001, 3, 23)
+GAMES_RANGE_END = date(2045, 3, 30)
+
+_END_OF_PAGES = object()
+
+async def ingest_teams_async(client):
     """"Potentially needs a for each on a list of seasons"""
     season = [2024]
+    validators = get_validator_store()
     try:
-        print('Fetching schedules data from NatStat API...')
-        url = f"https://api3.natst.at/{NATSTAT_API}/teams/PFB/2024"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        print('Fetching teams data from NatStat API...')
+        url = f"{NATSTAT_BASE_URL}/{NATSTAT_API}/teams/PFB/2024"
+        if validators is None:
+            data, validator = await client.get_json(url, endpoint="teams"), None
+        else:
+            data, validator = await client.get_json_if_changed(url, "teams", await asyncio.to_thread(validators.get, url))
     except Exception as e:
-        raise Exception(f"Failed to fetch data from SportsDataIO API: {e}")
+        raise Exception(f"Failed to fetch data from NatStat API: {e}")
 
-    try:
-        print('Storing in PostgreSQL...')
-        store_teams_data(data)
-    except Exception as e:
-        raise Exception(f"Failed to store data in PostgreSQL: {e}")
+    if data is None:
+        print('Teams unchanged since the last run; nothing to store.')
+        counts = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+    else:
+        try:
+            print('Storing in PostgreSQL...')
+            counts = await asyncio.to_thread(store_teams_data, data)
+        except Exception as e:
+            raise Exception(f"Failed to store data in PostgreSQL: {e}")
+    if validator is not None:
+        await asyncio.to_thread(validators.save, url, validator)
+    return counts
 
-def ingest_players_data():
+async def _iter_pages(client, url, key, validators=None):
     """
-    Ingest paginated player data from the API and store it in the database.
+    Yields (url, data, validator) for each successful page of a paginated NatStat endpoint, following
+    meta['page-next']. With a ValidatorStore pages are requested conditionally: an unchanged page comes with
+    data None and pagination continues from its stored next URL. validator is None for plain requests.
     """
-    url = f'https://api3.natst.at/{NATSTAT_API}/players/PFB/2024'
-
     while url:
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+        if validators is None:
+            data, validator = await client.get_json(url, endpoint=key), None
+        else:
+            data, validator = await client.get_json_if_changed(url, key, await asyncio.to_thread(validators.get, url))
+            if data is None:
+                yield url, None, validator
+                url = validator.get('next_url')
+                continue
 
-            # Check if the response is successful and contains player data
-            if data.get('success') == '1' and 'players' in data:
-                players_data = data['players']
-                
-                # Store players data using the store_players_data function
-                store_players_data({'players': players_data})
+        # Check if the response is successful and contains the expected data
+        if data.get('success') == '1' and key in data:
+            # Get the next page URL, if available
+            next_url = data['meta'].get('page-next', None)
+            if validator is not None:
+                validator['next_url'] = next_url
+            yield url, data, validator
+            url = next_url
+        else:
+            # Log if no data found or there is an error
+            print(f"No more data or error encountered: {data.get('error', {}).get('message', 'Unknown Error')}")
+            break
 
-                # Log success
-                print(f"Processed page with URI: {data['query']['uri']}")
-                
-                # Get the next page URL, if available
-                url = data['meta'].get('page-next', None)
+async def _fetch_pages(client, url, key, pages, validators=None):
+    """
+    Fetcher task: puts each page on the bounded pages queue. put() waits while the queue is full, so the
+    fetcher never runs more than the queue size ahead of the writer. Always ends with _END_OF_PAGES,
+    preceded by the exception if a fetch failed.
+    """
+    try:
+        async for page in _iter_pages(client, url, key, validators):
+            await pages.put(page)
+    except Exception as e:
+        await pages.put(e)
+    finally:
+        await pages.put(_END_OF_PAGES)
+
+async def _pipelined_pages(client, url, key, prefetch_pages, validators=None):
+    """Yields pages from a background fetcher task that runs at most prefetch_pages ahead."""
+    # One extra slot so the fetcher can always enqueue its final exception/_END_OF_PAGES marker
+    pages = asyncio.Queue(maxsize=prefetch_pages + 1)
+    fetcher = asyncio.create_task(_fetch_pages(client, url, key, pages, validators))
+    try:
+        while True:
+            item = await pages.get()
+            if item is _END_OF_PAGES:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        fetcher.cancel()
+        await asyncio.gather(fetcher, return_exceptions=True)
+
+async def _ingest_paginated(client, url, key, store_fn, prefetch_pages=None, validators=None):
+    """
+    Ingests a paginated NatStat endpoint, passing {key: page[key]} to store_fn (on a worker thread) for every
+    page. With prefetch_pages > 0 the next page is downloaded while the current one is being written;
+    prefetch_pages=0 fetches and stores strictly in turn. Returns (complete, totals): complete is False if the
+    run stopped on an error, and totals sums the row counts returned by store_fn over every stored page.
+    With validators (a ValidatorStore), unchanged pages are neither parsed nor stored, and each page's new
+    validator is saved only after the page has been stored.
+    """
+    prefetch_pages = NATSTAT_PREFETCH_PAGES if prefetch_pages is None else prefetch_pages
+    if prefetch_pages > 0:
+        pages = _pipelined_pages(client, url, key, prefetch_pages, validators)
+    else:
+        pages = _iter_pages(client, url, key, validators)
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+    pages_not_modified = 0
 
+    try:
+        async for page_url, data, validator in pages:
+            if data is None:
+                pages_not_modified += 1
+                print(f"Page unchanged, skipped: {page_url}")
             else:
-                # Log if no data found or there is an error
-                print(f"No more data or error encountered: {data.get('error', {}).get('message', 'Unknown Error')}")
-                break
+                counts = await asyncio.to_thread(store_fn, {key: data[key]}) or {}
+                for field in totals:
+                    totals[field] += counts.get(field, 0)
 
-        except Exception as e:
-            print(f"Failed to process data: {e}")
-            break
+                # Log success
+                print(f"Processed page with URI: {data['query']['uri']}")
+            if validator is not None:
+                await asyncio.to_thread(validators.save, page_url, validator)
+    except Exception as e:
+        print(f"Failed to process data: {e}")
+        return False, totals
+    finally:
+        await pages.aclose()
+        print(f"{key}: {totals['inserted']} inserted, {totals['updated']} updated, {totals['unchanged']} unchanged, "
+              f"{pages_not_modified} pages not modified")
+    return True, totals
 
+async def ingest_players_async(client):
+    """
+    Ingest paginated player data from the API and store it in the database.
+    """
+    url = f'{NATSTAT_BASE_URL}/{NATSTAT_API}/players/PFB/2024'
+    complete, totals = await _ingest_paginated(client, url, 'players', store_players_data,
+                                               validators=get_validator_store())
+    if not complete:
+        raise Exception("Players ingestion stopped on an error")
     print("Players ingestion complete.")
+    return totals
 
-def ingest_games_data():
+async def ingest_games_async(client, full_backfill=None, lookback_days=None):
     """
     Ingest paginated games data from the API and store it in the database.
+
+    Incremental by default: only requests games from the stored 'games' watermark (the latest gameday with a
+    final game) minus a look-back window for score corrections. Runs a full backfill from GAMES_BACKFILL_START
+    when no watermark exists yet, when full_backfill=True, or when NATSTAT_GAMES_FULL_BACKFILL=1.
     """
-    url = f'https://api3.natst.at/{NATSTAT_API}/games/PFB/2001-03-23,2045-03-30'
+    full_backfill = NATSTAT_GAMES_FULL_BACKFILL if full_backfill is None else full_backfill
+    lookback_days = NATSTAT_GAMES_LOOKBACK_DAYS if lookback_days is None else lookback_days
 
-    while url:
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+    start = GAMES_BACKFILL_START
+    watermark = None if full_backfill else await asyncio.to_thread(get_watermark, 'games')
+    if watermark:
+        start = max(GAMES_BACKFILL_START, watermark - timedelta(days=lookback_days))
+        print(f"Incremental games ingestion from {start} (watermark {watermark}, look-back {lookback_days} days)")
+    else:
+        print(f"Full games backfill from {start}")
 
-            # Check if the response is successful and contains player data
-            if data.get('success') == '1' and 'games' in data:
-                games_data = data['games']
-                
-                # Store players data using the store_players_data function
-                store_games_data({'games': games_data})
+    url = f'{NATSTAT_BASE_URL}/{NATSTAT_API}/games/PFB/{start.isoformat()},{GAMES_RANGE_END.isoformat()}'
+    # A full backfill re-stores every page, so it skips the validators
+    validators = None if full_backfill else get_validator_store()
+    complete, totals = await _ingest_paginated(client, url, 'games', store_games_data, validators=validators)
+    if not complete:
+        # The watermark only advances after every page in the window was stored
+        raise Exception(f"Games ingestion from {start} stopped on an error")
+    new_watermark = await asyncio.to_thread(compute_games_watermark)
+    if new_watermark:
+        await asyncio.to_thread(set_watermark, 'games', new_watermark)
+        print(f"Games watermark set to {new_watermark}")
+    print("Games ingestion complete.")
+    return totals
 
-                # Log success
-                print(f"Processed page with URI: {data['query']['uri']}")
-                
-                print(f"Next Page: {data['meta'].get('page-next', None)}")
-                # Get the next page URL, if available
-                url = data['meta'].get('page-next', None)
+async def ingest_live_games_async(client, start, end):
+    """
+    Re-ingests the games of a short gameday window (start..end, inclusive) for live-score polling. Pages
+    unchanged since the last poll are skipped via conditional requests, unchanged games by the row hash, and
+    the watermark is left to the full games run.
+    """
+    url = f'{NATSTAT_BASE_URL}/{NATSTAT_API}/games/PFB/{start.isoformat()},{end.isoformat()}'
+    complete, totals = await _ingest_paginated(client, url, 'games', store_games_data, prefetch_pages=0,
+                                               validators=get_validator_store())
+    if not complete:
+        raise Exception(f"Live games poll for {start}..{end} stopped on an error")
+    return totals
 
+# Paginated endpoints that can be replayed from the response archive, in replay order
+REPLAY_STORES = {
+    "teams": store_teams_data,
+    "players": store_players_data,
+    "games": store_games_data,
+}
 
-            else:
-                # Log if no data found or there is an error
-                print(f"No more data or error encountered: {data.get('error', {}).get('message', 'Unknown Error')}")
-                break
+async def replay_endpoint_async(archive, endpoint, store_fn):
+    """
+    Re-stores every archived page of an endpoint (the latest body of each URL, oldest fetch first so newer
+    pages win) through store_fn, as _ingest_paginated would have. Returns the summed row counts.
+    """
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+    entries = archive.entries(endpoint)
+    for entry in entries:
+        data = await asyncio.to_thread(archive.get_json, entry["url"])
+        if data.get('success') != '1' or endpoint not in data:
+            continue
+        counts = await asyncio.to_thread(store_fn, {endpoint: data[endpoint]}) or {}
+        for field in totals:
+            totals[field] += counts.get(field, 0)
+    print(f"{endpoint} replay of {len(entries)} archived pages: {totals['inserted']} inserted, "
+          f"{totals['updated']} updated, {totals['unchanged']} unchanged")
+    return totals
 
-        except Exception as e:
-            print(f"Failed to process data: {e}")
-            break
+def ingest_teams_data():
+    engine = get_engine()
+    return engine.run(ingest_teams_async(engine.client))
+
+def ingest_players_data():
+    engine = get_engine()
+    return engine.run(ingest_players_async(engine.client))
+
+def ingest_games_data(full_backfill=None, lookback_days=None):
+    engine = get_engine()
+    return engine.run(ingest_games_async(engine.client, full_backfill, lookback_days))
+
+def ingest_live_games(start, end):
+    engine = get_engine()
+    return engine.run(ingest_live_games_async(engine.client, start, end))
+
+def replay_archived_data(endpoints=tuple(REPLAY_STORES)):
+    """
+    Re-runs the store functions over archived NatStat pages without any network access, e.g. after fixing a
+    parsing bug, then refreshes the season summaries. Returns the row counts per endpoint.
+    """
+    archive = get_response_archive()
+    engine = get_engine()
+    results = {}
+    for endpoint in endpoints:
+        results[endpoint] = engine.run(replay_endpoint_async(archive, endpoint, REPLAY_STORES[endpoint]))
+    refresh_summaries()
+    return results
 
-    print("Games ingestion complete.")
-    
 # def ingest_schedules_data():
 #     """"Potentially needs a for each on a list of seasons"""
 #     season = [2024]
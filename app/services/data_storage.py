@@ -1,135 +1,133 @@
 import inspect
-from psycopg2.extras import execute_values
-from .db_connection import get_db_connection
-from .utility import parse_date
+from .db_connection import db_cursor
+from .bulk_upsert import bulk_upsert, copy_upsert
+from .utility import parse_date, season_for_date
+from .schema_setup import ensure_season_partitions
+from .response_cache import invalidate_response_cache
+from .summaries import queue_summary_refresh
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def store_teams_data(data):
+TEAM_COLUMNS = ["Code", "Name", "Location"]
+PLAYER_COLUMNS = ["Code", "Name", "Team", "TeamCode"]
+GAME_COLUMNS = [
+    "game_id", "visitor", "visitor_code", "score_vis", "home", "home_code", "score_home",
+    "gamestatus", "overtime", "winner_code", "loser_code", "gameday", "gameno", "venue", "venue_code",
+    "season"
+]
+STATLINE_COLUMNS = [
+    "statline_id", "player_id", "player_name", "position", "date", "season", "game_id", "team_id", "team_name",
+    "opponent_id", "opponent_name", "pass_attempts", "pass_completions", "pass_yards", "pass_yards_per_attempt",
+    "passing_touchdowns", "interceptions_thrown", "rush_attempts", "rush_yards", "rush_yards_per_attempt",
+    "rushing_touchdowns", "longest_run", "receptions", "receiving_yards", "receiving_yards_per_reception",
+    "receiving_touchdowns", "longest_reception", "fg_attempted", "fg_made", "performance_score",
+    "performance_score_season_average", "presence_rate", "presence_rate_adjusted", "statline",
+    "pcr_season", "pcr_efficiency", "pcr_efficiency_points", "pcr_power", "pcr_power_points", "pcr_speed_agility",
+    "pcr_speed_agility_points", "pcr_accuracy", "pcr_accuracy_points", "pcr_opponent_quality",
+    "pcr_opponent_quality_points", "pcr_points", "pcr_points_adjusted", "pcr_rank"
+]
+# Content hash of the normalized record; rows whose hash is unchanged are not rewritten on upsert
+ROW_HASH_COLUMN = "row_hash"
+
+def _invalidate_if_changed(counts, *tables):
+    """
+    Drops the cached API responses of tables after a committed upsert, but only if it inserted or updated
+    rows: an unchanged re-ingest leaves the cache warm.
+    """
+    if counts["inserted"] or counts["updated"]:
+        for table in tables:
+            invalidate_response_cache(table)
+
+def store_teams_data(data, batch_size=None):
     """
     Inserts or updates data in the 'teams' table. Assumes field names from the API match the database columns.
     """
     print(f"Running {inspect.currentframe().f_code.co_name}...")
 
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        insert_query = """
-        INSERT INTO teams (
-            "Code", "Name", "Location"
-        ) VALUES (
-            %(Code)s, %(Name)s, %(Location)s
-        )
-        ON CONFLICT ("Code") DO UPDATE SET
-            "Name" = EXCLUDED."Name",
-            "Location" = EXCLUDED."Location";
-        """
-        for team_id, team_data in data['teams'].items():
-            team_record = {
-                "Code": team_data['code'],
-                "Name": team_data['name'],
-                "Location": team_data['location']
-            }
-            cursor.execute(insert_query, team_record)
-
-        conn.commit()
-        print("Data inserted/updated successfully.")
+        with db_cursor() as cursor:
+            team_records = (
+                {
+                    "Code": team_data['code'],
+                    "Name": team_data['name'],
+                    "Location": team_data['location']
+                }
+                for team_id, team_data in data['teams'].items()
+            )
+            counts = bulk_upsert(cursor, "teams", TEAM_COLUMNS, ["Code"], team_records, batch_size=batch_size,
+                                 hash_column=ROW_HASH_COLUMN)
+        _invalidate_if_changed(counts, "teams")
+
+        print(f"Data inserted/updated successfully ({counts['inserted']} inserted, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged).")
+        return counts
     except Exception as e:
-        if conn:
-            conn.rollback()
         print(f"Database operation failed: {e}")
         raise
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
-def store_players_data(data):
+def store_players_data(data, batch_size=None):
     """
     Inserts or updates data in the 'players' table. Assumes field names from the API match the database columns.
     """
     print(f"Running {inspect.currentframe().f_code.co_name}...")
 
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        insert_query = """
-        INSERT INTO players (
-            "Code", "Name", "Team", "TeamCode"
-        ) VALUES (
-            %(Code)s, %(Name)s, %(Team)s, %(TeamCode)s
-        )
-        ON CONFLICT ("Code") DO UPDATE SET
-            "Name" = EXCLUDED."Name",
-            "Team" = EXCLUDED."Team",
-            "TeamCode" = EXCLUDED."TeamCode";
-        """
-        for player_id, player_data in data['players'].items():
-            player_record = {
-                "Code": player_data['code'],
-                "Name": player_data['name'],
-                "Team": player_data['team'],
-                "TeamCode": player_data['team-code']
-            }
-            cursor.execute(insert_query, player_record)
-
-        conn.commit()
-        print("Data inserted/updated successfully.")
+        with db_cursor() as cursor:
+            player_records = (
+                {
+                    "Code": player_data['code'],
+                    "Name": player_data['name'],
+                    "Team": player_data['team'],
+                    "TeamCode": player_data['team-code']
+                }
+                for player_id, player_data in data['players'].items()
+            )
+            counts = bulk_upsert(cursor, "players", PLAYER_COLUMNS, ["Code"], player_records, batch_size=batch_size,
+                                 hash_column=ROW_HASH_COLUMN)
+        _invalidate_if_changed(counts, "players")
+
+        print(f"Data inserted/updated successfully ({counts['inserted']} inserted, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged).")
+        return counts
     except Exception as e:
-        if conn:
-            conn.rollback()
         print(f"Database operation failed: {e}")
         raise
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
-def store_games_data(data):
+def _delete_moved_games(cursor, game_records):
+    """
+    A game_id lives in exactly one season. The upsert conflict key is (game_id, season), so a gameday corrected
+    across a season boundary (or first set on a game stored without one) would otherwise leave the game in its
+    old partition as well; the stale copy is deleted in the same transaction. Returns (home_code, visitor_code, season) of every deleted row so
+    the old season's summaries are refreshed too.
+    """
+    cursor.execute(
+        """
+        DELETE FROM games g
+        USING unnest(%s::varchar[], %s::integer[]) AS incoming (game_id, season)
+        WHERE g.game_id = incoming.game_id AND g.season IS DISTINCT FROM incoming.season
+        RETURNING g.home_code, g.visitor_code, g.season;
+        """,
+        ([record["game_id"] for record in game_records], [record["season"] for record in game_records])
+    )
+    moved = cursor.fetchall()
+    if moved:
+        print(f"Moved {len(moved)} games to another season's partition after a gameday correction")
+    return moved
+
+def store_games_data(data, batch_size=None):
     """
     Inserts or updates data in the 'games' table. Handles incomplete games by allowing NULL values.
+    Each game is routed to its season partition (derived from gameday), or to the default partition while its
+    gameday is missing or unparseable; a game whose corrected gameday falls in another season is moved. Both
+    teams of every changed game are queued for a season summary refresh.
     """
     print(f"Running {inspect.currentframe().f_code.co_name}...")
 
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        insert_query = """
-        INSERT INTO games (
-            game_id, visitor, visitor_code, score_vis, home, home_code, score_home, 
-            gamestatus, overtime, winner_code, loser_code, gameday, gameno, venue, venue_code
-        ) VALUES (
-            %(game_id)s, %(visitor)s, %(visitor_code)s, %(score_vis)s, %(home)s, %(home_code)s, %(score_home)s,
-            %(gamestatus)s, %(overtime)s, %(winner_code)s, %(loser_code)s, %(gameday)s, %(gameno)s, %(venue)s, %(venue_code)s
-        )
-        ON CONFLICT (game_id) DO UPDATE SET
-            visitor = EXCLUDED.visitor,
-            visitor_code = EXCLUDED.visitor_code,
-            score_vis = EXCLUDED.score_vis,
-            home = EXCLUDED.home,
-            home_code = EXCLUDED.home_code,
-            score_home = EXCLUDED.score_home,
-            gamestatus = EXCLUDED.gamestatus,
-            overtime = EXCLUDED.overtime,
-            winner_code = EXCLUDED.winner_code,
-            loser_code = EXCLUDED.loser_code,
-            gameday = EXCLUDED.gameday,
-            gameno = EXCLUDED.gameno,
-            venue = EXCLUDED.venue,
-            venue_code = EXCLUDED.venue_code;
-        """
-
-        for game_id, game_data in data['games'].items():
-            # Prepare the game record, handling cases where the value might be an empty dictionary
-            game_record = {
+        # Prepare the game records, handling cases where the value might be an empty dictionary
+        game_records = [
+            {
                 "game_id": game_data.get('id'),
                 "visitor": game_data.get('visitor') if isinstance(game_data.get('visitor'), str) else None,
                 "visitor_code": game_data.get('visitor-code'),
@@ -144,23 +142,94 @@ def store_games_data(data):
                 "gameday": game_data.get('gameday'),
                 "gameno": game_data.get('gameno'),
                 "venue": game_data.get('venue') if isinstance(game_data.get('venue'), str) else None,
-                "venue_code": game_data.get('venue-code')
+                "venue_code": game_data.get('venue-code'),
+                "season": season_for_date(game_data.get('gameday'))
             }
+            for game_id, game_data in data['games'].items()
+        ]
+        unseasoned = [record for record in game_records if record["season"] is None]
+        for record in unseasoned:
+            record["gameday"] = None  # An unparseable gameday is not a valid DATE either
+        if unseasoned:
+            logger.warning(f"Storing {len(unseasoned)} games without a parseable gameday in the default partition")
+        ensure_season_partitions("games", (record["season"] for record in game_records))
+        with db_cursor() as cursor:
+            moved = _delete_moved_games(cursor, game_records)
+            counts = bulk_upsert(cursor, "games", GAME_COLUMNS, ["game_id", "season"], game_records, batch_size=batch_size,
+                                 hash_column=ROW_HASH_COLUMN, returning=["home_code", "visitor_code", "season"])
+            queue_summary_refresh(cursor, "team", (
+                (team_code, season)
+                for home_code, visitor_code, season in moved + counts["changed"]
+                for team_code in (home_code, visitor_code)
+            ))
+        _invalidate_if_changed(counts, "games")
+
+        print(f"Data inserted/updated successfully ({counts['inserted']} inserted, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged).")
+        return counts
+    except Exception as e:
+        print(f"Database operation failed: {e}")
+        raise
 
-            cursor.execute(insert_query, game_record)
 
-        conn.commit()
-        print("Data inserted/updated successfully.")
+def store_player_statlines_data(rows):
+    """
+    Inserts or updates a batch of statlines in the 'player_statlines' table via COPY. rows are tuples in
+    STATLINE_COLUMNS order, as produced by plumbing.natstat_ingestion.rows_from_columns. Each row is routed to
+    its season partition; a missing season is derived from the statline date, and rows with neither go to the
+    default partition. Rows without a statline_id are skipped. Players with changed statlines are queued for a season summary refresh.
+    """
+    id_index, season_index, date_index = (STATLINE_COLUMNS.index(col) for col in ("statline_id", "season", "date"))
+    statline_rows = []
+    for row in rows:
+        if row[id_index] is None:
+            continue
+        if row[season_index] is None:
+            row = row[:season_index] + (season_for_date(row[date_index]),) + row[season_index + 1:]
+        statline_rows.append(row)
+    ensure_season_partitions("player_statlines", (row[season_index] for row in statline_rows))
+
+    try:
+        with db_cursor() as cursor:
+            counts = copy_upsert(cursor, "player_statlines", STATLINE_COLUMNS, ["statline_id", "season"], statline_rows,
+                                 hash_column=ROW_HASH_COLUMN, returning=["player_id", "season"])
+            queue_summary_refresh(cursor, "player", counts["changed"])
+        _invalidate_if_changed(counts, "player_statlines")
+
+        print(f"Statlines inserted/updated successfully ({counts['inserted']} inserted, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged).")
+        return counts
     except Exception as e:
-        if conn:
-            conn.rollback()
         print(f"Database operation failed: {e}")
         raise
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
+def get_watermark(endpoint):
+    """Returns the stored high-water mark (a date) for an ingestion endpoint, or None if it has never run."""
+    with db_cursor() as cursor:
+        cursor.execute("SELECT watermark FROM ingestion_state WHERE endpoint = %s;", (endpoint,))
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def set_watermark(endpoint, watermark):
+    """Persists the high-water mark for an ingestion endpoint."""
+    with db_cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO ingestion_state (endpoint, watermark, updated_at)
+            VALUES (%s, %s, NOW())
+            ON CONFLICT (endpoint) DO UPDATE SET
+                watermark = EXCLUDED.watermark,
+                updated_at = EXCLUDED.updated_at;
+            """,
+            (endpoint, watermark)
+        )
+
+def compute_games_watermark():
+    """Latest gameday that has a final game. Everything before it is treated as settled."""
+    with db_cursor() as cursor:
+        cursor.execute("SELECT MAX(gameday) FROM games WHERE gamestatus ILIKE 'final%%';")
+        row = cursor.fetchone()
+    return row[0] if row else None
 
 # def store_schedules_data(data):
 #     """
@@ -1,11 +1,22 @@
 import os
+import time
+import threading
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor ## Use RealDictCursor to return results as a dictionary 
+from psycopg2.extras import RealDictCursor ## Use RealDictCursor to return results as a dictionary
 from dotenv import load_dotenv
+from .metrics import REGISTRY, DB_POOL_WAIT_SECONDS
 
 load_dotenv()
 
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))  # Seconds before a connection is recycled
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))  # Seconds to wait for a free connection
+DB_POOL_HEALTH_CHECK_IDLE = float(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', '5'))  # Ping connections idle longer than this
+
 def get_db_connection():
+    """Opens a new, unpooled connection. Prefer db_transaction()/db_cursor() for regular work."""
     conn = psycopg2.connect(
         host=os.getenv('DB_HOST'),
         database=os.getenv('DB_NAME'),
@@ -14,3 +25,263 @@ def get_db_connection():
         port=os.getenv('DB_PORT', '5432')
     )
     return conn
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available within the checkout timeout."""
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool. Connections are health checked on checkout, recycled after
+    max_lifetime seconds, and checkout waits (blocking up to timeout) are recorded for stats().
+    """
+
+    def __init__(self, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE, max_lifetime=DB_POOL_MAX_LIFETIME,
+                 timeout=DB_POOL_TIMEOUT, health_check_idle=DB_POOL_HEALTH_CHECK_IDLE, connect=get_db_connection):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self._connect = connect
+
+        self._lock = threading.Condition()
+        self._idle = []  # (conn, returned_at) pairs, most recently returned last
+        self._created_at = {}  # id(conn) -> creation time
+        self._size = 0
+        self._closed = False
+
+        self._stats = {
+            "connections_created": 0,
+            "connections_discarded": 0,
+            "checkouts": 0,
+            "checkout_waits": 0,
+            "checkout_timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+        for _ in range(min_size):
+            conn = self._new_connection()
+            self._idle.append((conn, time.monotonic()))
+
+    def _new_connection(self):
+        conn = self._connect()
+        self._created_at[id(conn)] = time.monotonic()
+        self._size += 1
+        self._stats["connections_created"] += 1
+        return conn
+
+    def _open_reserved_slot(self):
+        """Connects outside the lock for a slot already counted in self._size."""
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._created_at.pop(id(conn), None)
+        self._size -= 1
+        self._stats["connections_discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_expired(self, conn):
+        return time.monotonic() - self._created_at.get(id(conn), 0) > self.max_lifetime
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.health_check_idle:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """
+        Checks out a connection, waiting up to self.timeout seconds if the pool is exhausted. An idle connection
+        is health-checked after the lock is released, so a slow ping does not hold up other checkouts.
+        """
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._lock:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        if self._is_expired(conn):
+                            self._discard(conn)
+                            continue
+                        break
+
+                    if self._size < self.max_size:
+                        # Reserve the slot before connecting so other threads cannot overshoot max_size
+                        self._size += 1
+                        self._record_checkout(started, waited)
+                        conn = None
+                        break
+
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._stats["checkout_timeouts"] += 1
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s (max_size={self.max_size})")
+                    waited = True
+                    self._lock.wait(remaining)
+
+            if conn is None:
+                return self._open_reserved_slot()
+            # The popped connection still counts towards self._size, so its slot stays taken while it is pinged
+            if self._is_healthy(conn, time.monotonic() - returned_at):
+                with self._lock:
+                    self._record_checkout(started, waited)
+                return conn
+            with self._lock:
+                self._discard(conn)
+                self._lock.notify()
+
+    def _record_checkout(self, started, waited):
+        wait = time.monotonic() - started
+        DB_POOL_WAIT_SECONDS.observe(wait, pool="psycopg2")
+        self._stats["checkouts"] += 1
+        self._stats["wait_seconds_total"] += wait
+        self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait)
+        if waited:
+            self._stats["checkout_waits"] += 1
+
+    def putconn(self, conn, discard=False):
+        """Returns a connection to the pool. Broken, expired or explicitly discarded connections are closed."""
+        with self._lock:
+            if not discard and not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+            if discard or conn.closed or self._closed or self._is_expired(conn):
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def closeall(self):
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._lock.notify_all()
+
+    def stats(self):
+        """Returns a snapshot of pool size and checkout wait metrics."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+            })
+            return snapshot
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = ConnectionPool()
+        return _pool
+
+def _collect_pool_stats():
+    """Exports the psycopg2 pool's occupancy and checkout counters for /metrics."""
+    if _pool is None:
+        return []
+    stats = _pool.stats()
+    return [
+        ("db_pool_connections", "gauge", "Pooled psycopg2 connections by state.",
+         [({"state": "idle"}, stats["idle"]), ({"state": "in_use"}, stats["in_use"])]),
+        ("db_pool_max_connections", "gauge", "Configured psycopg2 pool size limit.", [({}, stats["max_size"])]),
+        ("db_pool_checkout_timeouts_total", "counter", "Checkouts that gave up after DB_POOL_TIMEOUT.",
+         [({}, stats["checkout_timeouts"])]),
+    ]
+
+REGISTRY.add_collector(_collect_pool_stats)
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+@contextmanager
+def db_transaction():
+    """
+    Checks out a pooled connection for one transaction. Commits on success, rolls back on error
+    and always returns the connection to the pool.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception as e:
+        broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        raise
+    finally:
+        pool.putconn(conn, discard=broken)
+
+@contextmanager
+def db_cursor(cursor_factory=None):
+    """Same as db_transaction() but yields a cursor. Pass cursor_factory=RealDictCursor for dict rows."""
+    with db_transaction() as conn:
+        with conn.cursor(cursor_factory=cursor_factory) as cursor:
+            yield cursor
+
+@contextmanager
+def db_autocommit_cursor():
+    """
+    Yields a cursor on a pooled connection in autocommit mode, for statements that cannot run inside a
+    transaction block such as CREATE INDEX CONCURRENTLY.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            yield cursor
+    except Exception as e:
+        broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        raise
+    finally:
+        if not conn.closed:
+            try:
+                conn.autocommit = False
+            except psycopg2.Error:
+                broken = True
+        pool.putconn(conn, discard=broken)
@@ -0,0 +1,63 @@
+import os
+import threading
+from dotenv import load_dotenv
+from .db_connection import db_cursor
+
+load_dotenv()
+
+# Send conditional requests for teams/players/games pages. 0 always downloads and stores every page.
+NATSTAT_CONDITIONAL_REQUESTS = os.getenv('NATSTAT_CONDITIONAL_REQUESTS', '1') == '1'
+
+VALIDATOR_FIELDS = ("etag", "last_modified", "body_sha256", "next_url")
+
+class ValidatorStore:
+    """
+    Per-URL HTTP validators (ETag, Last-Modified, body hash) and the page's next URL, kept in the
+    http_validators table. Loaded once per process, then written through on save().
+    """
+
+    def __init__(self):
+        self._validators = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._validators is None:
+            with db_cursor() as cursor:
+                cursor.execute(f"SELECT url, {', '.join(VALIDATOR_FIELDS)} FROM http_validators;")
+                self._validators = {row[0]: dict(zip(VALIDATOR_FIELDS, row[1:])) for row in cursor.fetchall()}
+        return self._validators
+
+    def get(self, url):
+        with self._lock:
+            validator = self._load().get(url)
+            return dict(validator) if validator else None
+
+    def save(self, url, validator):
+        """Stores the validator for url. Call only after the page it describes has been stored."""
+        values = [validator.get(field) for field in VALIDATOR_FIELDS]
+        with db_cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO http_validators (url, {', '.join(VALIDATOR_FIELDS)}, updated_at)
+                VALUES (%s, {', '.join(['%s'] * len(VALIDATOR_FIELDS))}, NOW())
+                ON CONFLICT (url) DO UPDATE SET
+                    {', '.join(f'{field} = EXCLUDED.{field}' for field in VALIDATOR_FIELDS)},
+                    updated_at = EXCLUDED.updated_at;
+                """,
+                [url] + values
+            )
+        with self._lock:
+            self._load()[url] = dict(zip(VALIDATOR_FIELDS, values))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_validator_store():
+    """Returns the process-wide validator store, or None when conditional requests are disabled."""
+    global _store
+    if not NATSTAT_CONDITIONAL_REQUESTS:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ValidatorStore()
+        return _store
@@ -0,0 +1,110 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+from .metrics import track_job
+from .profiling import profiled
+
+load_dotenv()
+
+# Stages of one graph run at the same time. Stages are I/O bound (NatStat calls go through the shared
+# ingestion engine, writes through the shared connection pool), so threads are enough.
+JOB_GRAPH_MAX_WORKERS = int(os.getenv('JOB_GRAPH_MAX_WORKERS', '4'))
+
+class JobGraph:
+    """
+    A small dependency-aware runner for scheduler jobs. Stages are added with the stages they depend on and
+    run() starts each one as soon as all of its dependencies have succeeded, so independent stages overlap
+    and a run takes roughly as long as its critical path. A failed stage skips everything downstream of it
+    and the remaining stages still run.
+    """
+
+    def __init__(self, name, max_workers=JOB_GRAPH_MAX_WORKERS):
+        self.name = name
+        self.max_workers = max_workers
+        self._stages = {}
+        self._lock = threading.Lock()
+        self.last_run = None
+
+    def add(self, name, fn, depends_on=()):
+        """
+        Adds a stage. fn takes no arguments; a dict it returns (row counts) is kept in the run report.
+        Dependencies must already be added, which keeps the stages in a valid run order and the graph acyclic.
+        """
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already in job graph '{self.name}'")
+        unknown = [dep for dep in depends_on if dep not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage '{name}' depends on unknown stages: {', '.join(unknown)}")
+        self._stages[name] = (fn, tuple(depends_on))
+        return self
+
+    def _run_stage(self, name, fn):
+        print(f"[{self.name}] Starting stage '{name}'...")
+        started = time.perf_counter()
+        try:
+            with track_job(f"{self.name}.{name}"):
+                result = fn()
+        except Exception as e:
+            duration = time.perf_counter() - started
+            print(f"[{self.name}] Stage '{name}' failed after {duration:.1f}s: {e}")
+            return {"status": "failed", "duration_seconds": duration, "error": str(e)}
+        duration = time.perf_counter() - started
+        print(f"[{self.name}] Stage '{name}' finished in {duration:.1f}s")
+        return {"status": "succeeded", "duration_seconds": duration,
+                "counts": result if isinstance(result, dict) else None}
+
+    def critical_path(self, report):
+        """Longest chain of stage durations through the graph, as (seconds, [stage names])."""
+        longest = {}
+        for name, (fn, depends_on) in self._stages.items():  # Insertion order is a topological order
+            before = max((longest[dep] for dep in depends_on), default=(0.0, []))
+            longest[name] = (before[0] + report[name].get("duration_seconds", 0.0), before[1] + [name])
+        return max(longest.values(), default=(0.0, []))
+
+    def run(self):
+        """
+        Runs every stage once and returns the report: per stage its status ('succeeded', 'failed' or
+        'skipped'), duration and row counts. Raises if any stage failed, after the rest of the graph has run.
+        Concurrent calls (e.g. an overlapping scheduler run) wait for the running one to finish. With
+        PROFILING_ENABLED the run is profiled and the profile tagged with this report.
+        """
+        with self._lock, track_job(self.name), profiled(self.name) as profile_tags:
+            started = time.perf_counter()
+            report = {}
+            pending = dict(self._stages)
+            running = {}
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name) as pool:
+                while pending or running:
+                    for name, (fn, depends_on) in list(pending.items()):
+                        statuses = [report[dep]["status"] if dep in report else None for dep in depends_on]
+                        if any(status in ("failed", "skipped") for status in statuses):
+                            print(f"[{self.name}] Skipping stage '{name}': a dependency did not succeed")
+                            report[name] = {"status": "skipped"}
+                            del pending[name]
+                        elif all(status == "succeeded" for status in statuses):
+                            running[pool.submit(self._run_stage, name, fn)] = name
+                            del pending[name]
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        report[running.pop(future)] = future.result()
+
+            elapsed = time.perf_counter() - started
+            path_seconds, path = self.critical_path(report)
+            total = sum(stage.get("duration_seconds", 0.0) for stage in report.values())
+            print(f"[{self.name}] Finished in {elapsed:.1f}s (critical path {path_seconds:.1f}s via "
+                  f"{' -> '.join(path)}; {total:.1f}s of stage time)")
+            for name in self._stages:
+                stage = report[name]
+                counts = stage.get("counts")
+                details = f", {', '.join(f'{k}={v}' for k, v in counts.items())}" if counts else ""
+                print(f"  {name}: {stage['status']} {stage.get('duration_seconds', 0.0):.1f}s{details}")
+
+            self.last_run = {"finished_at": time.time(), "duration_seconds": elapsed, "stages": report}
+            profile_tags.update(job=self.name, critical_path=path, stages=report)
+            failed = [name for name, stage in report.items() if stage["status"] == "failed"]
+            if failed:
+                raise Exception(f"Job graph '{self.name}' stages failed: {', '.join(failed)}")
+            return report
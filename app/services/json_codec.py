@@ -0,0 +1,62 @@
+import os
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:  # The stdlib json is always available; orjson is several times faster both ways
+    orjson = None
+
+load_dotenv()
+
+# JSON codec for NatStat response decoding and API response encoding: 'orjson' or 'json'
+JSON_CODEC = os.getenv('JSON_CODEC', 'orjson' if orjson else 'json')
+
+def _default(value):
+    """
+    Values neither codec encodes natively: NUMERIC columns arrive as Decimal (encoded like FastAPI's
+    jsonable_encoder, whole numbers as int), dates and times from the stdlib path.
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class JsonCodec:
+    """A named pair of loads(bytes | str) -> object and dumps(object) -> bytes."""
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+def _stdlib_dumps(value):
+    # Same output settings as Starlette's JSONResponse
+    return json.dumps(value, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+CODECS = {"json": JsonCodec("json", json.loads, _stdlib_dumps)}
+if orjson is not None:
+    CODECS["orjson"] = JsonCodec("orjson", orjson.loads, lambda value: orjson.dumps(value, default=_default))
+
+def get_codec(name=None):
+    """Returns the named codec, JSON_CODEC by default."""
+    name = name or JSON_CODEC
+    if name not in CODECS:
+        if name == "orjson":
+            raise ValueError("JSON_CODEC=orjson requires the orjson package")
+        raise ValueError(f"Unknown JSON codec '{name}'")
+    return CODECS[name]
+
+_codec = get_codec()
+
+def loads(data):
+    """Decodes JSON bytes or str with the configured codec."""
+    return _codec.loads(data)
+
+def dumps(value):
+    """Encodes a value to JSON bytes with the configured codec."""
+    return _codec.dumps(value)
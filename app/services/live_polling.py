@@ -0,0 +1,79 @@
+import os
+from datetime import datetime, time, timedelta
+from dotenv import load_dotenv
+from .db_connection import db_cursor
+from .data_ingestion import ingest_live_games
+from .summaries import refresh_summaries
+
+load_dotenv()
+
+# Live-score polling: games table rows only carry a gameday, so a game window opens at LIVE_POLL_START_HOUR
+# (server local time) on each gameday with unfinished games and stays open until that hour the next day for
+# late finishes. Inside a window the open games are polled every LIVE_POLL_INTERVAL seconds. Opt-in, since
+# every poll spends NatStat request budget.
+LIVE_POLLING_ENABLED = os.getenv('LIVE_POLLING_ENABLED', '0') == '1'
+LIVE_POLL_INTERVAL = int(os.getenv('LIVE_POLL_INTERVAL', '120'))
+LIVE_POLL_START_HOUR = int(os.getenv('LIVE_POLL_START_HOUR', '12'))
+# Longest sleep between polls when no game window is coming up
+LIVE_POLL_IDLE_INTERVAL = int(os.getenv('LIVE_POLL_IDLE_INTERVAL', '604800'))
+
+def open_gamedays(since):
+    """Gamedays on or after since that still have games without a final status (served by games_open_gameday_idx)."""
+    with db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT DISTINCT gameday FROM games
+            WHERE gameday >= %s AND (gamestatus IS NULL OR gamestatus NOT ILIKE 'final%%')
+            ORDER BY gameday;
+            """,
+            (since,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def live_window(now=None):
+    """
+    Returns (start, end) of the gamedays currently being played, or None outside a game window. A gameday is
+    live from LIVE_POLL_START_HOUR until its last game is final, or at the latest until LIVE_POLL_START_HOUR
+    the next day, so late finishes are picked up but a postponed game does not keep the window open.
+    """
+    now = now or datetime.now()
+    today = now.date()
+    started = now.hour >= LIVE_POLL_START_HOUR
+    live = [
+        gameday for gameday in open_gamedays(today - timedelta(days=1))
+        if (gameday == today and started) or (gameday < today and not started)
+    ]
+    return (live[0], live[-1]) if live else None
+
+def next_poll_time(now=None):
+    """When to poll next: soon inside a game window, otherwise at the next window opening (at most a week out)."""
+    now = now or datetime.now()
+    if live_window(now):
+        return now + timedelta(seconds=LIVE_POLL_INTERVAL)
+
+    idle_until = now + timedelta(seconds=LIVE_POLL_IDLE_INTERVAL)
+    upcoming = open_gamedays(now.date())
+    if upcoming:
+        opens = datetime.combine(upcoming[0], time(hour=LIVE_POLL_START_HOUR))
+        if opens > now:
+            return min(opens, idle_until)
+    return idle_until
+
+def poll_live_games(now=None):
+    """
+    Re-ingests the games of the current game window, if any, and refreshes the team summaries of games that
+    changed. Returns the time of the next poll.
+    """
+    now = now or datetime.now()
+    window = live_window(now)
+    if window is None:
+        print("No games in progress; skipping live poll.")
+    else:
+        start, end = window
+        print(f"Polling live games for {start}..{end}...")
+        ingest_live_games(start, end)
+        refresh_summaries()
+
+    next_run = next_poll_time(datetime.now())
+    print(f"Next live poll at {next_run:%Y-%m-%d %H:%M}.")
+    return next_run
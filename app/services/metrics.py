@@ -0,0 +1,194 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Upper bounds (seconds) of the buckets of every duration histogram
+METRICS_DURATION_BUCKETS = tuple(sorted(float(bound) for bound in os.getenv(
+    'METRICS_DURATION_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,300,900,3600'
+).split(',')))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """A named metric with a fixed set of label names; one value (or histogram) per label combination."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, [(label, value)], sample value) for every exposed sample."""
+        with self._lock:
+            return [("", list(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = list(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append(("_bucket", labels + [("le", _format_value(bound))], cumulative))
+                samples.append(("_sum", labels, total))
+                samples.append(("_count", labels, cumulative))
+        return samples
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the with block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+class MetricsRegistry:
+    """
+    Process-wide metrics, rendered in the Prometheus text exposition format by render(). Besides the
+    metrics registered here, collectors (functions returning [(name, kind, help, [(labels dict, value)])])
+    export stats that are already kept elsewhere, such as ClientStats and the connection pool, at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Metrics collector {collector.__name__} failed: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+NATSTAT_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "natstat_request_duration_seconds", "Duration of each NatStat/interst.at HTTP attempt.", ("endpoint", "status")))
+NATSTAT_DECODE_SECONDS = REGISTRY.register(Histogram(
+    "natstat_decode_duration_seconds", "Time spent decoding NatStat JSON bodies.", ("endpoint",)))
+ROWS_WRITTEN = REGISTRY.register(Counter(
+    "rows_written_total", "Rows sent to upserts, by table and outcome.", ("table", "result")))
+UPSERT_BATCH_SECONDS = REGISTRY.register(Histogram(
+    "upsert_batch_duration_seconds", "Duration of one upsert statement (execute_values batch or COPY merge).",
+    ("table", "method")))
+JOB_SECONDS = REGISTRY.register(Histogram(
+    "job_duration_seconds", "Duration of scheduler jobs and job graph stages.", ("job", "status")))
+JOB_LAST_SUCCESS = REGISTRY.register(Gauge(
+    "job_last_success_timestamp_seconds", "Unix time the job or stage last succeeded.", ("job",)))
+DB_POOL_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "db_pool_wait_seconds", "Time spent waiting to check out a database connection.", ("pool",)))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "API request duration by route template.", ("method", "route", "status")))
+
+@contextmanager
+def track_job(job):
+    """Records a job's duration and status, and its last success time when it does not raise."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        JOB_SECONDS.observe(time.perf_counter() - started, job=job, status="failed")
+        raise
+    JOB_SECONDS.observe(time.perf_counter() - started, job=job, status="succeeded")
+    JOB_LAST_SUCCESS.set(time.time(), job=job)
+
+def record_upsert(table, method, seconds, counts):
+    """Records one upsert statement's duration and its inserted/updated/unchanged row counts."""
+    UPSERT_BATCH_SECONDS.observe(seconds, table=table, method=method)
+    for result in ("inserted", "updated", "unchanged"):
+        if counts.get(result):
+            ROWS_WRITTEN.inc(counts[result], table=table, result=result)
+
+def render_metrics():
+    return REGISTRY.render()
@@ -0,0 +1,427 @@
+from functools import partial
+from .db_connection import db_transaction, db_autocommit_cursor
+from .schema_setup import setup_indexes
+
+# The index sets of the index migrations, frozen here: schema_setup.INDEXES is the current list and may change,
+# an applied migration must not. (name, table, definition) as in schema_setup.INDEXES.
+SECONDARY_INDEXES_V5 = (
+    ("games_gameday_idx", "games", "(gameday)"),
+    ("games_home_code_gameday_idx", "games", "(home_code, gameday)"),
+    ("games_visitor_code_gameday_idx", "games", "(visitor_code, gameday)"),
+    ("games_open_gameday_idx", "games", "(gameday) WHERE gamestatus IS NULL OR gamestatus NOT ILIKE 'final%'"),
+    ("players_teamcode_idx", "players", '("TeamCode")'),
+    ("player_statlines_player_season_idx", "player_statlines", "(player_id, season)"),
+    ("player_statlines_game_id_idx", "player_statlines", "(game_id)"),
+    ("player_statlines_date_brin", "player_statlines", "USING BRIN (date)"),
+)
+# Migration 6 rebuilds games and player_statlines, dropping their indexes; players keeps its own
+SECONDARY_INDEXES_V7 = (
+    ("games_gameday_idx", "games", "(gameday)"),
+    ("games_home_code_gameday_idx", "games", "(home_code, gameday)"),
+    ("games_visitor_code_gameday_idx", "games", "(visitor_code, gameday)"),
+    ("games_open_gameday_idx", "games", "(gameday) WHERE gamestatus IS NULL OR gamestatus NOT ILIKE 'final%'"),
+    ("player_statlines_player_season_idx", "player_statlines", "(player_id, season)"),
+    ("player_statlines_game_id_idx", "player_statlines", "(game_id)"),
+    ("player_statlines_date_brin", "player_statlines", "USING BRIN (date)"),
+)
+
+# Ordered schema history: (version, description, step). A step is SQL run inside the migration transaction,
+# or a callable for work that cannot run in a transaction block (CREATE INDEX CONCURRENTLY), which manages
+# its own connections. Never edit an applied entry; append a new version instead.
+MIGRATIONS = [
+    (1, "teams, players and games tables", """
+    CREATE TABLE IF NOT EXISTS teams (
+        id SERIAL PRIMARY KEY,
+        "Code" VARCHAR(10) NOT NULL,
+        "Name" VARCHAR(50) NOT NULL,
+        "Location" VARCHAR(100) NOT NULL,
+        UNIQUE ("Code")
+    );
+    CREATE TABLE IF NOT EXISTS players (
+        "Code" VARCHAR(20) PRIMARY KEY,
+        "Name" VARCHAR(100),
+        "Team" VARCHAR(100),
+        "TeamCode" VARCHAR(10)
+    );
+    CREATE TABLE IF NOT EXISTS games (
+        id SERIAL PRIMARY KEY,
+        game_id VARCHAR(10) NOT NULL,
+        visitor VARCHAR(50),
+        visitor_code VARCHAR(10),
+        score_vis INTEGER NULL,  -- Score can be NULL if not available yet
+        home VARCHAR(50),
+        home_code VARCHAR(10),
+        score_home INTEGER NULL, -- Score can be NULL if not available yet
+        gamestatus VARCHAR(20) NULL,  -- Status can be NULL for future games
+        overtime CHAR(10) NULL,  -- Overtime info can be NULL if not known yet
+        winner_code VARCHAR(10) NULL,  -- Winner can be NULL for future games
+        loser_code VARCHAR(10) NULL,   -- Loser can be NULL for future games 
+        gameday DATE,
+        gameno INTEGER,
+        venue VARCHAR(100),
+        venue_code VARCHAR(10),
+        UNIQUE (game_id)
+    );
+    """),
+    (2, "ingestion_state watermarks", """
+    CREATE TABLE IF NOT EXISTS ingestion_state (
+        endpoint VARCHAR(50) PRIMARY KEY,
+        watermark DATE,  -- High-water mark for incremental ingestion (e.g. last gameday with a final game)
+        updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+    """),
+    (3, "row_hash change-detection columns", """
+    ALTER TABLE teams ADD COLUMN IF NOT EXISTS row_hash CHAR(32);
+    ALTER TABLE players ADD COLUMN IF NOT EXISTS row_hash CHAR(32);
+    ALTER TABLE games ADD COLUMN IF NOT EXISTS row_hash CHAR(32);
+    """),
+    (4, "player_statlines table", """
+    CREATE TABLE IF NOT EXISTS player_statlines (
+        statline_id VARCHAR(20) PRIMARY KEY,
+        player_id VARCHAR(20) NOT NULL,
+        player_name VARCHAR(100),
+        position VARCHAR(10),
+        date DATE,
+        season INTEGER,
+        game_id VARCHAR(20),
+        team_id VARCHAR(20),
+        team_name VARCHAR(100),
+        opponent_id VARCHAR(20),
+        opponent_name VARCHAR(100),
+        pass_attempts NUMERIC,
+        pass_completions NUMERIC,
+        pass_yards NUMERIC,
+        pass_yards_per_attempt NUMERIC,
+        passing_touchdowns NUMERIC,
+        interceptions_thrown NUMERIC,
+        rush_attempts NUMERIC,
+        rush_yards NUMERIC,
+        rush_yards_per_attempt NUMERIC,
+        rushing_touchdowns NUMERIC,
+        longest_run NUMERIC,
+        receptions NUMERIC,
+        receiving_yards NUMERIC,
+        receiving_yards_per_reception NUMERIC,
+        receiving_touchdowns NUMERIC,
+        longest_reception NUMERIC,
+        fg_attempted NUMERIC,
+        fg_made NUMERIC,
+        performance_score NUMERIC,
+        performance_score_season_average NUMERIC,
+        presence_rate NUMERIC,
+        presence_rate_adjusted NUMERIC,
+        statline TEXT,
+        -- Player Contribution Rating for the season; NULL when NatStat has no PCR block for the player
+        pcr_season INTEGER,
+        pcr_efficiency NUMERIC,
+        pcr_efficiency_points NUMERIC,
+        pcr_power NUMERIC,
+        pcr_power_points NUMERIC,
+        pcr_speed_agility NUMERIC,
+        pcr_speed_agility_points NUMERIC,
+        pcr_accuracy NUMERIC,
+        pcr_accuracy_points NUMERIC,
+        pcr_opponent_quality NUMERIC,
+        pcr_opponent_quality_points NUMERIC,
+        pcr_points NUMERIC,
+        pcr_points_adjusted NUMERIC,
+        pcr_rank INTEGER,
+        row_hash CHAR(32)  -- Content hash used to skip unchanged rows on upsert
+    );
+    """),
+    (5, "secondary indexes", partial(setup_indexes, SECONDARY_INDEXES_V5)),
+    (6, "partition games and player_statlines by season", """
+    -- Move the unpartitioned tables aside; their constraint/sequence names are needed by the new tables
+    ALTER TABLE games RENAME TO games_unpartitioned;
+    ALTER INDEX games_pkey RENAME TO games_unpartitioned_pkey;
+    ALTER TABLE games_unpartitioned RENAME CONSTRAINT games_game_id_key TO games_unpartitioned_game_id_key;
+    ALTER SEQUENCE games_id_seq RENAME TO games_unpartitioned_id_seq;
+    ALTER TABLE player_statlines RENAME TO player_statlines_unpartitioned;
+    ALTER INDEX player_statlines_pkey RENAME TO player_statlines_unpartitioned_pkey;
+
+    CREATE TABLE games (
+        id SERIAL,
+        game_id VARCHAR(10) NOT NULL,
+        visitor VARCHAR(50),
+        visitor_code VARCHAR(10),
+        score_vis INTEGER NULL,  -- Score can be NULL if not available yet
+        home VARCHAR(50),
+        home_code VARCHAR(10),
+        score_home INTEGER NULL, -- Score can be NULL if not available yet
+        gamestatus VARCHAR(20) NULL,  -- Status can be NULL for future games
+        overtime CHAR(10) NULL,  -- Overtime info can be NULL if not known yet
+        winner_code VARCHAR(10) NULL,  -- Winner can be NULL for future games
+        loser_code VARCHAR(10) NULL,   -- Loser can be NULL for future games
+        gameday DATE,
+        gameno INTEGER,
+        venue VARCHAR(100),
+        venue_code VARCHAR(10),
+        row_hash CHAR(32),  -- Content hash used to skip unchanged rows on upsert
+        season INTEGER,  -- March-February season of gameday; the partition key, NULL while gameday is unknown
+        -- Unique keys rather than a primary key, so season can be NULL; a NULL season is one key value
+        UNIQUE NULLS NOT DISTINCT (id, season),
+        UNIQUE NULLS NOT DISTINCT (game_id, season)
+    ) PARTITION BY LIST (season);
+
+    CREATE TABLE player_statlines (
+        statline_id VARCHAR(20) NOT NULL,
+        player_id VARCHAR(20) NOT NULL,
+        player_name VARCHAR(100),
+        position VARCHAR(10),
+        date DATE,
+        season INTEGER,
+        game_id VARCHAR(20),
+        team_id VARCHAR(20),
+        team_name VARCHAR(100),
+        opponent_id VARCHAR(20),
+        opponent_name VARCHAR(100),
+        pass_attempts NUMERIC,
+        pass_completions NUMERIC,
+        pass_yards NUMERIC,
+        pass_yards_per_attempt NUMERIC,
+        passing_touchdowns NUMERIC,
+        interceptions_thrown NUMERIC,
+        rush_attempts NUMERIC,
+        rush_yards NUMERIC,
+        rush_yards_per_attempt NUMERIC,
+        rushing_touchdowns NUMERIC,
+        longest_run NUMERIC,
+        receptions NUMERIC,
+        receiving_yards NUMERIC,
+        receiving_yards_per_reception NUMERIC,
+        receiving_touchdowns NUMERIC,
+        longest_reception NUMERIC,
+        fg_attempted NUMERIC,
+        fg_made NUMERIC,
+        performance_score NUMERIC,
+        performance_score_season_average NUMERIC,
+        presence_rate NUMERIC,
+        presence_rate_adjusted NUMERIC,
+        statline TEXT,
+        -- Player Contribution Rating for the season; NULL when NatStat has no PCR block for the player
+        pcr_season INTEGER,
+        pcr_efficiency NUMERIC,
+        pcr_efficiency_points NUMERIC,
+        pcr_power NUMERIC,
+        pcr_power_points NUMERIC,
+        pcr_speed_agility NUMERIC,
+        pcr_speed_agility_points NUMERIC,
+        pcr_accuracy NUMERIC,
+        pcr_accuracy_points NUMERIC,
+        pcr_opponent_quality NUMERIC,
+        pcr_opponent_quality_points NUMERIC,
+        pcr_points NUMERIC,
+        pcr_points_adjusted NUMERIC,
+        pcr_rank INTEGER,
+        row_hash CHAR(32),  -- Content hash used to skip unchanged rows on upsert
+        UNIQUE NULLS NOT DISTINCT (statline_id, season)
+    ) PARTITION BY LIST (season);
+
+    -- Statlines without a season take the season of their date, as store_player_statlines_data does
+    UPDATE player_statlines_unpartitioned
+    SET season = CASE WHEN EXTRACT(MONTH FROM date) >= 3 THEN EXTRACT(YEAR FROM date)
+                      ELSE EXTRACT(YEAR FROM date) - 1 END
+    WHERE season IS NULL AND date IS NOT NULL;
+
+    -- Rows without a season (no gameday, or no season and no date) are kept in the default partitions
+    CREATE TABLE games_default PARTITION OF games DEFAULT;
+    CREATE TABLE player_statlines_default PARTITION OF player_statlines DEFAULT;
+
+    -- One partition per season already in the data. Later seasons are created on first write.
+    DO $$
+    DECLARE
+        s INTEGER;
+    BEGIN
+        FOR s IN
+            SELECT DISTINCT CASE WHEN EXTRACT(MONTH FROM gameday) >= 3 THEN EXTRACT(YEAR FROM gameday)
+                                 ELSE EXTRACT(YEAR FROM gameday) - 1 END
+            FROM games_unpartitioned WHERE gameday IS NOT NULL
+        LOOP
+            EXECUTE format('CREATE TABLE games_%s PARTITION OF games FOR VALUES IN (%s)', s, s);
+        END LOOP;
+        FOR s IN SELECT DISTINCT season FROM player_statlines_unpartitioned WHERE season IS NOT NULL
+        LOOP
+            EXECUTE format('CREATE TABLE player_statlines_%s PARTITION OF player_statlines FOR VALUES IN (%s)', s, s);
+        END LOOP;
+    END $$;
+
+    -- row_hash is cleared because season is now part of the hashed record
+    INSERT INTO games (game_id, visitor, visitor_code, score_vis, home, home_code, score_home, gamestatus, overtime,
+                       winner_code, loser_code, gameday, gameno, venue, venue_code, season)
+    SELECT game_id, visitor, visitor_code, score_vis, home, home_code, score_home, gamestatus, overtime,
+           winner_code, loser_code, gameday, gameno, venue, venue_code,
+           CASE WHEN EXTRACT(MONTH FROM gameday) >= 3 THEN EXTRACT(YEAR FROM gameday)
+                ELSE EXTRACT(YEAR FROM gameday) - 1 END
+    FROM games_unpartitioned;
+
+    INSERT INTO player_statlines SELECT * FROM player_statlines_unpartitioned;
+
+    DROP TABLE games_unpartitioned;
+    DROP TABLE player_statlines_unpartitioned;
+    """),
+    (7, "secondary indexes on the partitioned tables", partial(setup_indexes, SECONDARY_INDEXES_V7)),
+    (8, "team and player season summaries", """
+    -- Precomputed from final games; rebuilt per (team_code, season) by services.summaries
+    CREATE TABLE team_season_summaries (
+        team_code VARCHAR(10) NOT NULL,
+        season INTEGER NOT NULL,
+        games INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        losses INTEGER NOT NULL,
+        ties INTEGER NOT NULL,
+        points_for INTEGER,
+        points_against INTEGER,
+        points_for_per_game NUMERIC,
+        points_against_per_game NUMERIC,
+        refreshed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (team_code, season)
+    );
+
+    -- Precomputed from player_statlines; rebuilt per (player_id, season) by services.summaries
+    CREATE TABLE player_season_summaries (
+        player_id VARCHAR(20) NOT NULL,
+        season INTEGER NOT NULL,
+        player_name VARCHAR(100),
+        position VARCHAR(10),
+        team_id VARCHAR(20),
+        team_name VARCHAR(100),
+        games INTEGER NOT NULL,
+        pass_attempts NUMERIC,
+        pass_completions NUMERIC,
+        pass_yards NUMERIC,
+        passing_touchdowns NUMERIC,
+        interceptions_thrown NUMERIC,
+        rush_attempts NUMERIC,
+        rush_yards NUMERIC,
+        rushing_touchdowns NUMERIC,
+        receptions NUMERIC,
+        receiving_yards NUMERIC,
+        receiving_touchdowns NUMERIC,
+        fg_attempted NUMERIC,
+        fg_made NUMERIC,
+        pass_yards_per_game NUMERIC,
+        rush_yards_per_game NUMERIC,
+        receiving_yards_per_game NUMERIC,
+        avg_performance_score NUMERIC,
+        refreshed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (player_id, season)
+    );
+    CREATE INDEX player_season_summaries_season_position_idx ON player_season_summaries (season, position);
+
+    -- Summary keys whose source rows changed since the last refresh. Written in the same transaction as the
+    -- source rows, so a committed change is never missed.
+    CREATE TABLE summary_refresh_queue (
+        summary VARCHAR(20) NOT NULL,  -- 'team' or 'player'
+        key VARCHAR(20) NOT NULL,      -- team_code or player_id
+        season INTEGER NOT NULL,
+        queued_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (summary, key, season)
+    );
+
+    -- Queue everything already ingested so the first refresh builds the summaries; rows without a season
+    -- (the default partitions) belong to no season summary
+    INSERT INTO summary_refresh_queue (summary, key, season)
+    SELECT 'team', home_code, season FROM games WHERE home_code IS NOT NULL AND season IS NOT NULL
+    UNION
+    SELECT 'team', visitor_code, season FROM games WHERE visitor_code IS NOT NULL AND season IS NOT NULL
+    UNION
+    SELECT 'player', player_id, season FROM player_statlines WHERE season IS NOT NULL;
+    """),
+    (9, "http_validators for conditional NatStat requests", """
+    CREATE TABLE http_validators (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        body_sha256 CHAR(64),  -- Fallback when the server sends no validators
+        next_url TEXT,         -- The page's meta['page-next'], so pagination continues past a 304
+        updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+    """),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Serializes migration runs across processes starting at the same time
+MIGRATION_LOCK_ID = 8120415
+
+def _current_version(cursor):
+    cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL;")
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version;")
+    return cursor.fetchone()[0]
+
+def _record(cursor, version, description):
+    cursor.execute(
+        "INSERT INTO schema_version (version, description) VALUES (%s, %s) ON CONFLICT (version) DO NOTHING;",
+        (version, description)
+    )
+    print(f"Applied migration {version}: {description}")
+
+def _apply_pending(migrations):
+    """
+    Applies every migration newer than the recorded version, in order. Consecutive SQL migrations share one
+    transaction; a callable migration runs on its own once what came before it has committed, and is
+    recorded after it returns. The caller holds the migration lock.
+    """
+    while True:
+        deferred = None
+        with db_transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description VARCHAR(200),
+                        applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                    );
+                    """
+                )
+                # Another process may have migrated while we waited for the lock
+                current = _current_version(cursor)
+                for version, description, step in migrations:
+                    if version <= current:
+                        continue
+                    if callable(step):
+                        deferred = (version, description, step)
+                        break
+                    del conn.notices[:]
+                    cursor.execute(step)
+                    for notice in conn.notices:
+                        print(f"Migration {version}: {notice.strip()}")
+                    del conn.notices[:]
+                    _record(cursor, version, description)
+
+        if deferred is None:
+            return migrations[-1][0]
+        version, description, step = deferred
+        step()
+        with db_transaction() as conn:
+            with conn.cursor() as cursor:
+                _record(cursor, version, description)
+
+def run_migrations(migrations=MIGRATIONS):
+    """
+    Brings the database schema up to the latest version. When it is already current this is one
+    connection, one transaction and a single version lookup, with no DDL. Otherwise pending migrations are
+    applied under a session-level advisory lock, held on a connection of its own from before the version is
+    re-read until the last migration, callable ones (CREATE INDEX CONCURRENTLY) included, has been recorded.
+    Processes starting at the same time therefore apply each migration once.
+
+    Returns:
+        int: The schema version after the run.
+    """
+    latest = migrations[-1][0]
+    with db_transaction() as conn:
+        with conn.cursor() as cursor:
+            current = _current_version(cursor)
+    if current >= latest:
+        print(f"Schema is current (version {current}).")
+        return current
+
+    with db_autocommit_cursor() as lock:
+        lock.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+        try:
+            return _apply_pending(migrations)
+        finally:
+            lock.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
@@ -0,0 +1,229 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from .response_archive import archive_response
+from .json_codec import loads
+from .metrics import REGISTRY, NATSTAT_REQUEST_SECONDS, NATSTAT_DECODE_SECONDS
+
+load_dotenv()
+
+# Match these to the NatStat plan. Defaults allow a steady 1 request/second with bursts of 10.
+NATSTAT_REQUESTS_PER_MINUTE = float(os.getenv('NATSTAT_REQUESTS_PER_MINUTE', '60'))
+NATSTAT_BURST = int(os.getenv('NATSTAT_BURST', '10'))
+NATSTAT_MAX_RETRIES = int(os.getenv('NATSTAT_MAX_RETRIES', '5'))
+NATSTAT_BACKOFF_BASE = float(os.getenv('NATSTAT_BACKOFF_BASE', '1'))  # Seconds
+NATSTAT_BACKOFF_MAX = float(os.getenv('NATSTAT_BACKOFF_MAX', '60'))  # Seconds
+NATSTAT_TIMEOUT = float(os.getenv('NATSTAT_TIMEOUT', '30'))  # Seconds
+NATSTAT_POOL_SIZE = int(os.getenv('NATSTAT_POOL_SIZE', '4'))
+# API roots. Overridden to point ingestion at a local stand-in server (see benchmarks.natstat_stub).
+NATSTAT_BASE_URL = os.getenv('NATSTAT_BASE_URL', 'https://api3.natst.at').rstrip('/')
+INTERSTAT_BASE_URL = os.getenv('INTERSTAT_BASE_URL', 'https://interst.at').rstrip('/')
+# Hosts that share the NatStat plan's rate limit. Other hosts (e.g. interst.at) are not throttled.
+NATSTAT_RATE_LIMITED_HOSTS = set(os.getenv('NATSTAT_RATE_LIMITED_HOSTS', urlparse(NATSTAT_BASE_URL).hostname).split(','))
+# Most recent request latencies kept per client for percentiles
+NATSTAT_LATENCY_SAMPLES = int(os.getenv('NATSTAT_LATENCY_SAMPLES', '10000'))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens refill continuously at rate per second up to capacity.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes one token and returns how many seconds the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """Blocks until a token is available. Returns the seconds spent waiting."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+def parse_retry_after(value):
+    """Converts a Retry-After header (delta-seconds or HTTP-date) to seconds, or None if absent/invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt, retry_after=None, base=NATSTAT_BACKOFF_BASE, cap=NATSTAT_BACKOFF_MAX):
+    """
+    Full-jitter exponential backoff for the given 0-based retry attempt. A server-provided
+    Retry-After is treated as a floor.
+    """
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+class ClientStats:
+    """Thread-safe request counters shared by the NatStat HTTP clients."""
+
+    FIELDS = ("requests", "retries", "throttled", "server_errors", "network_errors", "failures", "not_modified",
+              "unchanged_bodies")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+        self._counts["rate_limit_wait_seconds"] = 0.0
+        self._counts["backoff_wait_seconds"] = 0.0
+        self._latencies = deque(maxlen=NATSTAT_LATENCY_SAMPLES)
+
+    def incr(self, field, amount=1):
+        with self._lock:
+            self._counts[field] += amount
+
+    def observe_latency(self, seconds, endpoint="default", status="error"):
+        """
+        Records the duration of one HTTP attempt (status is the HTTP status, or 'error' for a network error)
+        in the request latency histogram. Only the last NATSTAT_LATENCY_SAMPLES are kept for percentiles.
+        """
+        NATSTAT_REQUEST_SECONDS.observe(seconds, endpoint=endpoint, status=status)
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def latency_percentiles(self, quantiles=(0.5, 0.99)):
+        """{quantile: seconds} over the recorded latencies (nearest rank), or {} before any request."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return {}
+        return {q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] for q in quantiles}
+
+    def reset_latencies(self):
+        with self._lock:
+            self._latencies.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+class NatStatClient:
+    """
+    Pooled HTTP client for the NatStat API. One requests.Session keeps connections to NATSTAT_BASE_URL alive
+    across pages, every request to a NATSTAT_RATE_LIMITED_HOSTS host first takes a token from the rate
+    limiter, and 429/5xx responses or network errors are retried with jittered exponential backoff that
+    honours Retry-After.
+    """
+
+    def __init__(self, requests_per_minute=NATSTAT_REQUESTS_PER_MINUTE, burst=NATSTAT_BURST,
+                 max_retries=NATSTAT_MAX_RETRIES, timeout=NATSTAT_TIMEOUT, pool_size=NATSTAT_POOL_SIZE):
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self.stats = ClientStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, headers=None, endpoint="default"):
+        """GETs a URL with rate limiting and retries. Raises requests.HTTPError once retries are exhausted."""
+        attempt = 0
+        while True:
+            if urlparse(url).hostname in NATSTAT_RATE_LIMITED_HOSTS:
+                self.stats.incr("rate_limit_wait_seconds", self.bucket.acquire())
+            self.stats.incr("requests")
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.stats.observe_latency(time.perf_counter() - started, endpoint)
+                self.stats.incr("network_errors")
+                if attempt >= self.max_retries:
+                    self.stats.incr("failures")
+                    raise
+                error = e
+            else:
+                self.stats.observe_latency(time.perf_counter() - started, endpoint, response.status_code)
+                if response.status_code not in RETRY_STATUSES:
+                    if response.status_code >= 400:
+                        self.stats.incr("failures")
+                    response.raise_for_status()
+                    return response
+
+                self.stats.incr("throttled" if response.status_code == 429 else "server_errors")
+                if attempt >= self.max_retries:
+                    self.stats.incr("failures")
+                    response.raise_for_status()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                error = f"HTTP {response.status_code}"
+
+            delay = backoff_delay(attempt, retry_after)
+            print(f"NatStat request failed ({error}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            self.stats.incr("retries")
+            self.stats.incr("backoff_wait_seconds", delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def get_json(self, url, endpoint="default"):
+        """GETs a URL, archives the raw body (see services.response_archive) and decodes it."""
+        response = self.get(url, endpoint=endpoint)
+        archive_response(url, endpoint, response.content)
+        with NATSTAT_DECODE_SECONDS.time(endpoint=endpoint):
+            return loads(response.content)
+
+    def close(self):
+        self.session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_natstat_client():
+    """Returns the process-wide NatStat client so every ingestion job shares one session and rate limit."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = NatStatClient()
+        return _client
+
+def _collect_client_stats():
+    """Exports the shared ClientStats counters (also counting the async client's requests) for /metrics."""
+    if _client is None:
+        return []
+    snapshot = _client.stats.snapshot()
+    return [
+        ("natstat_client_events_total", "counter", "NatStat client request outcomes.",
+         [({"event": field}, snapshot[field]) for field in ClientStats.FIELDS]),
+        ("natstat_rate_limit_wait_seconds_total", "counter", "Time spent waiting on the NatStat rate limiter.",
+         [({}, snapshot["rate_limit_wait_seconds"])]),
+        ("natstat_backoff_wait_seconds_total", "counter", "Time spent backing off before retries.",
+         [({}, snapshot["backoff_wait_seconds"])]),
+    ]
+
+REGISTRY.add_collector(_collect_client_stats)
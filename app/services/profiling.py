@@ -0,0 +1,139 @@
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import random
+import threading
+from collections import Counter
+from contextlib import contextmanager, asynccontextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Opt-in sampling profiler for scheduled jobs and a sample of API requests. Each profiled run writes
+# <timestamp>-<name>.folded (collapsed stacks for flamegraph.pl / speedscope) and a .json with its tags.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'
+PROFILING_DIR = os.getenv(
+    'PROFILING_DIR',
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'profiles'))
+)
+PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', '0.005'))  # Seconds between stack samples
+PROFILING_API_SAMPLE_RATE = float(os.getenv('PROFILING_API_SAMPLE_RATE', '0.01'))  # Fraction of API requests
+
+def _frame_label(code):
+    # Keyed by function (first line), not the sampled line, so a function's samples fold into one frame
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler. A daemon thread reads every thread's current stack each interval and counts
+    identical stacks, so the profiled code runs unmodified and the cost is one stack walk per thread per
+    sample. With thread_ids only those threads are sampled; otherwise every thread is, prefixed with its
+    name, which covers job graph workers, the ingestion engine's loop and its to_thread workers alike.
+    Waiting threads are sampled too: time blocked on the network or the database shows up as such.
+    """
+
+    def __init__(self, thread_ids=None, interval=PROFILING_INTERVAL):
+        self.thread_ids = set(thread_ids) if thread_ids else None
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        """Collapsed-stack lines ('root;...;leaf count'), heaviest first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def write_profile(name, profiler, tags):
+    """Writes the folded stacks and the tags next to each other in PROFILING_DIR. Returns the .folded path."""
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_')
+    base = os.path.join(PROFILING_DIR, f"{datetime.now():%Y%m%dT%H%M%S%f}-{slug}")
+    with open(base + ".folded", "w", encoding="utf-8") as folded:
+        folded.write(profiler.folded())
+    with open(base + ".json", "w", encoding="utf-8") as meta:
+        json.dump(dict(tags, name=name, samples=profiler.samples, interval_seconds=profiler.interval), meta,
+                  indent=2, default=str)
+    return base + ".folded"
+
+def _finish(name, profiler, tags, status, started_at, started):
+    """Stops the profiler and writes its profile with the run's tags. Never raises."""
+    profiler.stop()
+    tags.update(status=status, started_at=started_at.isoformat(), duration_seconds=time.perf_counter() - started)
+    try:
+        path = write_profile(name, profiler, tags)
+        print(f"Profile of '{name}' written to {path} ({profiler.samples} samples)")
+    except Exception as e:
+        print(f"Failed to write profile of '{name}': {e}")
+
+@contextmanager
+def profiled(name, thread_ids=None, enabled=None):
+    """
+    Profiles the with block when PROFILING_ENABLED (or enabled=True). Yields a dict the caller can fill with
+    tags such as row counts; status, start time and duration are added. Writing the profile never raises.
+    """
+    tags = {}
+    if not (PROFILING_ENABLED if enabled is None else enabled):
+        yield tags
+        return
+
+    profiler = SamplingProfiler(thread_ids).start()
+    started_at, started = datetime.now(), time.perf_counter()
+    status = "succeeded"
+    try:
+        yield tags
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        _finish(name, profiler, tags, status, started_at, started)
+
+@asynccontextmanager
+async def profiled_async(name, thread_ids=None, enabled=None):
+    """profiled() for coroutines: the profile is stopped and written on a worker thread, off the event loop."""
+    tags = {}
+    if not (PROFILING_ENABLED if enabled is None else enabled):
+        yield tags
+        return
+
+    profiler = SamplingProfiler(thread_ids).start()
+    started_at, started = datetime.now(), time.perf_counter()
+    status = "succeeded"
+    try:
+        yield tags
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        await asyncio.to_thread(_finish, name, profiler, tags, status, started_at, started)
+
+def should_profile_request():
+    """Whether to profile this API request: PROFILING_ENABLED and within PROFILING_API_SAMPLE_RATE."""
+    return PROFILING_ENABLED and random.random() < PROFILING_API_SAMPLE_RATE
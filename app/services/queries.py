@@ -0,0 +1,46 @@
+from .async_db import fetch, fetch_prepared, fetchrow_prepared
+from .data_storage import STATLINE_COLUMNS
+
+async def get_teams():
+    return await fetch_prepared("teams")
+
+async def get_team(code):
+    return await fetchrow_prepared("team", code)
+
+async def get_players(team_code=None, limit=100, offset=0):
+    """Players ordered by code, optionally restricted to one team."""
+    return await fetch_prepared("players", team_code, limit, offset)
+
+async def get_player(code):
+    return await fetchrow_prepared("player", code)
+
+async def get_games(start=None, end=None, team_code=None, status=None, limit=100, offset=0):
+    """
+    Games ordered by gameday. start/end bound the gameday (inclusive), team_code matches either side and
+    status is compared case-insensitively to gamestatus.
+    """
+    return await fetch_prepared("games", start, end, team_code, status, limit, offset)
+
+async def get_game(game_id):
+    return await fetchrow_prepared("game", game_id)
+
+_STATLINES_QUERY = f"""
+    SELECT {', '.join(STATLINE_COLUMNS)} FROM player_statlines
+    WHERE ($1::text IS NULL OR player_id = $1)
+      AND ($2::int IS NULL OR season = $2)
+      AND ($3::text IS NULL OR game_id = $3)
+      AND ($4::text IS NULL OR position = $4)
+    ORDER BY date DESC, statline_id LIMIT $5 OFFSET $6
+"""
+
+async def get_player_statlines(player_id=None, season=None, game_id=None, position=None, limit=100, offset=0):
+    """Statlines ordered by date, newest first, filtered by any combination of player, season, game and position."""
+    return await fetch(_STATLINES_QUERY, player_id, season, game_id, position, limit, offset)
+
+async def get_team_summaries(season=None, team_code=None):
+    """Precomputed team records and points for/against, best record first within each season."""
+    return await fetch_prepared("team_summaries", season, team_code)
+
+async def get_player_summaries(season=None, position=None, player_id=None, limit=100, offset=0):
+    """Precomputed player season totals and averages, highest average performance score first."""
+    return await fetch_prepared("player_summaries", season, position, player_id, limit, offset)
@@ -0,0 +1,188 @@
+import os
+import asyncio
+import gzip
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from .json_codec import loads
+
+try:
+    import zstandard
+except ImportError:  # gzip is always available; zstd is faster and smaller when installed
+    zstandard = None
+
+load_dotenv()
+
+# Raw NatStat responses are kept here so pages can be re-parsed and re-stored without the network.
+RESPONSE_ARCHIVE_ENABLED = os.getenv('RESPONSE_ARCHIVE_ENABLED', '1') == '1'
+RESPONSE_ARCHIVE_DIR = os.getenv(
+    'RESPONSE_ARCHIVE_DIR',
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'response_archive'))
+)
+# 'zstd' or 'gzip'. Blobs record their codec in the file name, so both can be read whatever is configured.
+RESPONSE_ARCHIVE_CODEC = os.getenv('RESPONSE_ARCHIVE_CODEC', 'zstd' if zstandard else 'gzip')
+RESPONSE_ARCHIVE_LEVEL = int(os.getenv('RESPONSE_ARCHIVE_LEVEL', '3' if RESPONSE_ARCHIVE_CODEC == 'zstd' else '6'))
+
+CODEC_EXTENSIONS = {"zstd": ".json.zst", "gzip": ".json.gz"}
+
+class ArchiveMiss(LookupError):
+    """Raised in replay when a URL was never archived."""
+
+class ResponseArchive:
+    """
+    Content-addressed store of raw response bodies. Each distinct body is compressed once into
+    blobs/<sha256[:2]>/<sha256>.json.zst (or .gz), and index.jsonl records which URL returned which body and
+    when. Re-fetching a URL whose body has not changed writes nothing.
+    """
+
+    def __init__(self, root=RESPONSE_ARCHIVE_DIR, codec=RESPONSE_ARCHIVE_CODEC, level=RESPONSE_ARCHIVE_LEVEL):
+        if codec == "zstd" and zstandard is None:
+            raise ValueError("RESPONSE_ARCHIVE_CODEC=zstd requires the zstandard package")
+        if codec not in CODEC_EXTENSIONS:
+            raise ValueError(f"Unknown response archive codec '{codec}'")
+        self.root = root
+        self.codec = codec
+        self.level = level
+        self._index_path = os.path.join(root, "index.jsonl")
+        self._latest = None  # url -> latest index entry, loaded on first use
+        self._lock = threading.Lock()
+        self._stats = {"archived": 0, "unchanged": 0, "blobs_written": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+    def _load_index(self):
+        if self._latest is None:
+            self._latest = {}
+            if os.path.exists(self._index_path):
+                with open(self._index_path, encoding="utf-8") as index:
+                    for line in index:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._latest[entry["url"]] = entry
+        return self._latest
+
+    def _blob_path(self, sha256, codec):
+        return os.path.join(self.root, "blobs", sha256[:2], sha256 + CODEC_EXTENSIONS[codec])
+
+    def _find_blob(self, sha256):
+        for codec in CODEC_EXTENSIONS:
+            path = self._blob_path(sha256, codec)
+            if os.path.exists(path):
+                return path, codec
+        return None, None
+
+    def _compress(self, body):
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compress(body)
+        return gzip.compress(body, compresslevel=self.level)
+
+    @staticmethod
+    def _decompress(data, codec):
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Reading .zst archive blobs requires the zstandard package")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def put(self, url, endpoint, body):
+        """Archives a raw response body for url. Returns its sha256."""
+        sha256 = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            latest = self._load_index().get(url)
+            if latest is not None and latest["sha256"] == sha256:
+                self._stats["unchanged"] += 1
+                return sha256
+
+            path, _ = self._find_blob(sha256)
+            if path is None:
+                path = self._blob_path(sha256, self.codec)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                compressed = self._compress(body)
+                # Write then rename so a crash never leaves a truncated blob under its final name
+                with open(path + ".tmp", "wb") as blob:
+                    blob.write(compressed)
+                os.replace(path + ".tmp", path)
+                self._stats["blobs_written"] += 1
+                self._stats["stored_bytes"] += len(compressed)
+
+            entry = {
+                "url": url,
+                "endpoint": endpoint,
+                "sha256": sha256,
+                "bytes": len(body),
+                "fetched_at": datetime.now(timezone.utc).isoformat(),
+            }
+            with open(self._index_path, "a", encoding="utf-8") as index:
+                index.write(json.dumps(entry) + "\n")
+            self._latest[url] = entry
+            self._stats["archived"] += 1
+            self._stats["raw_bytes"] += len(body)
+        return sha256
+
+    def get(self, url):
+        """Returns the latest archived body for url, or raises ArchiveMiss."""
+        with self._lock:
+            entry = self._load_index().get(url)
+        if entry is None:
+            raise ArchiveMiss(f"No archived response for {url}")
+        return self.read_blob(entry["sha256"])
+
+    def get_json(self, url, endpoint=None):
+        """Decoded latest body for url. endpoint is ignored; it matches the clients' get_json signature."""
+        return loads(self.get(url))
+
+    def read_blob(self, sha256):
+        path, codec = self._find_blob(sha256)
+        if path is None:
+            raise ArchiveMiss(f"Archived body {sha256} is missing from {self.root}")
+        with open(path, "rb") as blob:
+            return self._decompress(blob.read(), codec)
+
+    def entries(self, endpoint=None):
+        """Latest index entry per URL (optionally for one endpoint), oldest fetch first so replays end on the newest data."""
+        with self._lock:
+            latest = list(self._load_index().values())
+        if endpoint is not None:
+            latest = [entry for entry in latest if entry["endpoint"] == endpoint]
+        return sorted(latest, key=lambda entry: entry["fetched_at"])
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+_archive = None
+_archive_lock = threading.Lock()
+
+def get_response_archive():
+    """Returns the process-wide archive, creating it on first use."""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = ResponseArchive()
+        return _archive
+
+def archive_response(url, endpoint, body):
+    """
+    Archives a response body when RESPONSE_ARCHIVE_ENABLED. Never raises: a full disk must not fail ingestion.
+    """
+    if not RESPONSE_ARCHIVE_ENABLED:
+        return
+    try:
+        get_response_archive().put(url, endpoint, body)
+    except Exception as e:
+        print(f"Failed to archive response for {url}: {e}")
+
+class ReplayNatStatClient:
+    """
+    Stands in for AsyncNatStatClient and serves every URL from the response archive, so the normal
+    ingestion code re-parses and re-stores archived pages without touching the network.
+    """
+
+    def __init__(self, archive=None):
+        self.archive = archive or get_response_archive()
+
+    async def get_json(self, url, endpoint="default"):
+        return await asyncio.to_thread(self.archive.get_json, url, endpoint)
+
+    async def close(self):
+        pass
@@ -0,0 +1,91 @@
+import os
+import threading
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_CACHE_TTL = float(os.getenv('API_CACHE_TTL', '60'))  # Seconds a cached response stays fresh
+API_CACHE_MAXSIZE = int(os.getenv('API_CACHE_MAXSIZE', '1024'))  # Entries kept before least recently used are evicted
+
+class ResponseCache:
+    """
+    Thread-safe TTL + LRU cache for API responses. Keys start with the table the response was read from,
+    so invalidate(table) drops exactly the responses an ingestion write made stale.
+    """
+
+    def __init__(self, maxsize=API_CACHE_MAXSIZE, ttl=API_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "stale_loads": 0}
+        # Bumped by invalidate(), per table and for everything, so a load that overlapped one is not stored
+        self._generation = 0
+        self._table_generations = {}
+
+    def _generation_of(self, table):
+        return self._generation, self._table_generations.get(table, 0)
+
+    def _lookup(self, key):
+        """(True, value, None) on a hit; (False, None, generation) on a miss, to be passed to _store()."""
+        with self._lock:
+            try:
+                value = self._cache[key]
+                self._stats["hits"] += 1
+                return True, value, None
+            except KeyError:
+                self._stats["misses"] += 1
+                return False, None, self._generation_of(key[0])
+
+    def _store(self, key, value, generation):
+        """Caches a loaded value unless its table was invalidated while it loaded; it is returned either way."""
+        with self._lock:
+            if self._generation_of(key[0]) == generation:
+                self._cache[key] = value
+            else:
+                self._stats["stale_loads"] += 1
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for key (a tuple starting with the table name), calling loader() on a miss."""
+        hit, value, generation = self._lookup(key)
+        if hit:
+            return value
+        # Load outside the lock so a slow query does not block cache hits for other keys
+        value = loader()
+        self._store(key, value, generation)
+        return value
+
+    async def get_or_load_async(self, key, loader):
+        """get_or_load() for async handlers: loader is a zero-argument coroutine function."""
+        hit, value, generation = self._lookup(key)
+        if hit:
+            return value
+        value = await loader()
+        self._store(key, value, generation)
+        return value
+
+    def invalidate(self, table=None):
+        """Drops every cached response read from table, or everything when table is None."""
+        with self._lock:
+            if table is None:
+                self._cache.clear()
+                self._generation += 1
+            else:
+                for key in [key for key in self._cache.keys() if key[0] == table]:
+                    self._cache.pop(key, None)
+                self._table_generations[table] = self._table_generations.get(table, 0) + 1
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({"size": self._cache.currsize, "max_size": self._cache.maxsize, "ttl": self._cache.ttl})
+            return snapshot
+
+_cache = ResponseCache()
+
+def get_response_cache():
+    return _cache
+
+def invalidate_response_cache(table=None):
+    """Called after an ingestion write commits so the API stops serving the old rows."""
+    _cache.invalidate(table)
@@ -1,4 +1,4 @@
-from .db_connection import get_db_connection
+from .db_connection import db_cursor, db_autocommit_cursor
 
 # def setup_timeframes_table():
 #     create_table_query = """
@@ -42,98 +42,112 @@ from .db_connection import get_db_connection
 #             cursor.close()
 #             conn.close()
 
-def setup_teams_table():
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS teams (
-        id SERIAL PRIMARY KEY,
-        "Code" VARCHAR(10) NOT NULL,
-        "Name" VARCHAR(50) NOT NULL,
-        "Location" VARCHAR(100) NOT NULL,
-        UNIQUE ("Code")
-    );
+# Secondary indexes matched to the API and ingestion access patterns: (name, table, definition). Migrations
+# keep their own frozen copies (services.migrations), so a change here ships with a new migration.
+INDEXES = [
+    # Date-range scans and the incremental ingestion window
+    ("games_gameday_idx", "games", "(gameday)"),
+    # Team schedule lookups; a team filter matches either side, so both get a composite index
+    ("games_home_code_gameday_idx", "games", "(home_code, gameday)"),
+    ("games_visitor_code_gameday_idx", "games", "(visitor_code, gameday)"),
+    # Open games are few and are what live polling and the current-week lists read
+    ("games_open_gameday_idx", "games", "(gameday) WHERE gamestatus IS NULL OR gamestatus NOT ILIKE 'final%'"),
+    ("players_teamcode_idx", "players", '("TeamCode")'),
+    ("player_statlines_player_season_idx", "player_statlines", "(player_id, season)"),
+    ("player_statlines_game_id_idx", "player_statlines", "(game_id)"),
+    # Statlines arrive roughly in date order, so a BRIN index stays tiny
+    ("player_statlines_date_brin", "player_statlines", "USING BRIN (date)"),
+]
+
+def setup_indexes(indexes=INDEXES):
+    """
+    Creates any missing index from INDEXES. Indexes on tables that already hold rows are built CONCURRENTLY so
+    ingestion and API reads are not blocked; an invalid index left by an interrupted concurrent build is
+    dropped and rebuilt. Postgres cannot build an index on a partitioned table concurrently, so those are
+    built normally (cascading to every partition).
     """
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(create_table_query)
-        conn.commit()
-        print("Table 'teams' is set up.")
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        print(f"Failed to set up table 'teams': {e}")
-        raise
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+    for name, table, definition in indexes:
+        try:
+            with db_autocommit_cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT i.indisvalid FROM pg_index i
+                    JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = %s AND pg_table_is_visible(c.oid);
+                    """,
+                    (name,)
+                )
+                row = cursor.fetchone()
+                if row and row[0]:
+                    continue
+                if row:
+                    print(f"Index '{name}' is invalid; rebuilding.")
+                    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+
+                cursor.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM {table}), (SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass);",
+                    (table,)
+                )
+                has_rows, partitioned = cursor.fetchone()
+                concurrently = "CONCURRENTLY " if has_rows and not partitioned else ""
+                cursor.execute(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} {definition};")
+            print(f"Index '{name}' is set up.")
+        except Exception as e:
+            print(f"Failed to set up index '{name}': {e}")
+            raise
+
+# Tables LIST-partitioned by season. Each season lives in <table>_<season>, created on first write; rows whose
+# season is unknown (NULL) live in the DEFAULT partition <table>_default.
+SEASON_PARTITIONED_TABLES = ("games", "player_statlines")
 
-def setup_players_table():
-    create_table_query = """
-        CREATE TABLE IF NOT EXISTS players (
-            "Code" VARCHAR(20) PRIMARY KEY,
-            "Name" VARCHAR(100),
-            "Team" VARCHAR(100),
-            "TeamCode" VARCHAR(10)
-        );
-        """
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(create_table_query)
-        conn.commit()
-        print("Table 'players' is set up.")
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        print(f"Failed to set up table 'players': {e}")
-        raise
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+_known_partitions = set()
 
-def setup_games_table():
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS games (
-        id SERIAL PRIMARY KEY,
-        game_id VARCHAR(10) NOT NULL,
-        visitor VARCHAR(50),
-        visitor_code VARCHAR(10),
-        score_vis INTEGER NULL,  -- Score can be NULL if not available yet
-        home VARCHAR(50),
-        home_code VARCHAR(10),
-        score_home INTEGER NULL, -- Score can be NULL if not available yet
-        gamestatus VARCHAR(20) NULL,  -- Status can be NULL for future games
-        overtime CHAR(10) NULL,  -- Overtime info can be NULL if not known yet
-        winner_code VARCHAR(10) NULL,  -- Winner can be NULL for future games
-        loser_code VARCHAR(10) NULL,   -- Loser can be NULL for future games 
-        gameday DATE,
-        gameno INTEGER,
-        venue VARCHAR(100),
-        venue_code VARCHAR(10),
-        UNIQUE (game_id)
-    );
+def ensure_season_partitions(table, seasons):
+    """
+    Creates any missing <table>_<season> partition for the given seasons before rows are written to them, and
+    <table>_default if a season is None. DDL runs on its own autocommit connection, so a partition exists even
+    if the caller's write rolls back; partitions already seen by this process are skipped without touching
+    the database.
+    """
+    seasons = set(seasons)
+    bounds = [(str(season), f"FOR VALUES IN ({season})")
+              for season in sorted({int(season) for season in seasons if season is not None})]
+    if None in seasons:
+        bounds.append(("default", "DEFAULT"))
+    missing = [(f"{table}_{suffix}", bound) for suffix, bound in bounds if f"{table}_{suffix}" not in _known_partitions]
+    if not missing:
+        return
+    with db_autocommit_cursor() as cursor:
+        for partition, bound in missing:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (partition,))
+            if not cursor.fetchone()[0]:
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} {bound};")
+                print(f"Created partition '{partition}'.")
+            _known_partitions.add(partition)
+
+def report_index_usage():
+    """
+    Prints and returns scan counts and sizes for every index on the public tables, least used first,
+    so unused indexes stand out.
     """
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(create_table_query)
-        conn.commit()
-        print("Table 'games' is set up.")
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        print(f"Failed to set up table 'games': {e}")
-        raise
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+    with db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT relname, indexrelname, idx_scan, idx_tup_read, pg_size_pretty(pg_relation_size(indexrelid))
+            FROM pg_stat_user_indexes
+            WHERE schemaname = 'public'
+            ORDER BY idx_scan, relname, indexrelname;
+            """
+        )
+        rows = cursor.fetchall()
 
+    usage = [
+        {"table": table, "index": index, "scans": scans, "tuples_read": tuples_read, "size": size}
+        for table, index, scans, tuples_read, size in rows
+    ]
+    for entry in usage:
+        print(f"{entry['table']}.{entry['index']}: {entry['scans']} scans, {entry['tuples_read']} tuples read, {entry['size']}")
+    return usage
 
 # def setup_schedules_table():
 #     create_table_query = """
@@ -0,0 +1,143 @@
+import time
+import logging
+from psycopg2.extras import execute_values
+from .db_connection import db_cursor
+from .response_cache import invalidate_response_cache
+
+logger = logging.getLogger(__name__)
+
+# Rebuilds the team summaries of the queued (team_code, season) keys from final games
+TEAM_SUMMARY_QUERY = """
+    INSERT INTO team_season_summaries (team_code, season, games, wins, losses, ties, points_for, points_against,
+                                       points_for_per_game, points_against_per_game)
+    SELECT team_code, season,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE winner_code = team_code),
+           COUNT(*) FILTER (WHERE loser_code = team_code),
+           COUNT(*) - COUNT(*) FILTER (WHERE winner_code = team_code) - COUNT(*) FILTER (WHERE loser_code = team_code),
+           SUM(points_for),
+           SUM(points_against),
+           ROUND(AVG(points_for), 2),
+           ROUND(AVG(points_against), 2)
+    FROM (
+        SELECT home_code AS team_code, season, score_home AS points_for, score_vis AS points_against,
+               winner_code, loser_code
+        FROM games WHERE season = ANY(%(seasons)s) AND gamestatus ILIKE 'final%%'
+        UNION ALL
+        SELECT visitor_code, season, score_vis, score_home, winner_code, loser_code
+        FROM games WHERE season = ANY(%(seasons)s) AND gamestatus ILIKE 'final%%'
+    ) team_games
+    WHERE (team_code, season) IN (SELECT * FROM unnest(%(keys)s::text[], %(key_seasons)s::int[]))
+    GROUP BY team_code, season;
+"""
+
+# Rebuilds the player summaries of the queued (player_id, season) keys. Name, position and team come from
+# the player's latest statline of the season.
+PLAYER_SUMMARY_QUERY = """
+    INSERT INTO player_season_summaries (player_id, season, player_name, position, team_id, team_name, games,
+                                         pass_attempts, pass_completions, pass_yards, passing_touchdowns,
+                                         interceptions_thrown, rush_attempts, rush_yards, rushing_touchdowns,
+                                         receptions, receiving_yards, receiving_touchdowns, fg_attempted, fg_made,
+                                         pass_yards_per_game, rush_yards_per_game, receiving_yards_per_game,
+                                         avg_performance_score)
+    SELECT player_id, season,
+           (ARRAY_AGG(player_name ORDER BY date DESC))[1],
+           (ARRAY_AGG(position ORDER BY date DESC))[1],
+           (ARRAY_AGG(team_id ORDER BY date DESC))[1],
+           (ARRAY_AGG(team_name ORDER BY date DESC))[1],
+           COUNT(*),
+           SUM(pass_attempts), SUM(pass_completions), SUM(pass_yards), SUM(passing_touchdowns),
+           SUM(interceptions_thrown), SUM(rush_attempts), SUM(rush_yards), SUM(rushing_touchdowns),
+           SUM(receptions), SUM(receiving_yards), SUM(receiving_touchdowns), SUM(fg_attempted), SUM(fg_made),
+           ROUND(COALESCE(SUM(pass_yards), 0) / COUNT(*), 2),
+           ROUND(COALESCE(SUM(rush_yards), 0) / COUNT(*), 2),
+           ROUND(COALESCE(SUM(receiving_yards), 0) / COUNT(*), 2),
+           ROUND(AVG(performance_score), 2)
+    FROM player_statlines
+    WHERE season = ANY(%(seasons)s)
+      AND (player_id, season) IN (SELECT * FROM unnest(%(keys)s::text[], %(key_seasons)s::int[]))
+    GROUP BY player_id, season;
+"""
+
+# summary name in summary_refresh_queue -> (summary table, key column, rebuild query)
+SUMMARIES = {
+    "team": ("team_season_summaries", "team_code", TEAM_SUMMARY_QUERY),
+    "player": ("player_season_summaries", "player_id", PLAYER_SUMMARY_QUERY),
+}
+
+def queue_summary_refresh(cursor, summary, keys):
+    """
+    Marks (key, season) pairs of a summary as stale. Call it with the cursor that wrote the source rows so
+    the mark commits or rolls back with them.
+    """
+    keys = {(key, season) for key, season in keys if key is not None and season is not None}
+    if not keys:
+        return
+    execute_values(
+        cursor,
+        """
+        INSERT INTO summary_refresh_queue (summary, key, season) VALUES %s
+        ON CONFLICT (summary, key, season) DO NOTHING;
+        """,
+        [(summary, key, season) for key, season in keys]
+    )
+
+def refresh_summary(summary):
+    """
+    Rebuilds the rows of one summary whose keys are queued, then clears them from the queue, in one
+    transaction. A concurrent refresh waits on the queued rows and finds nothing left to do.
+
+    Returns:
+        int: Number of (key, season) pairs refreshed.
+    """
+    table, key_column, query = SUMMARIES[summary]
+    started = time.perf_counter()
+    with db_cursor() as cursor:
+        cursor.execute("DELETE FROM summary_refresh_queue WHERE summary = %s RETURNING key, season;", (summary,))
+        queued = cursor.fetchall()
+        if not queued:
+            return 0
+
+        params = {
+            "keys": [key for key, season in queued],
+            "key_seasons": [season for key, season in queued],
+            "seasons": sorted({season for key, season in queued}),
+        }
+        # Deleting first also drops summaries whose source rows no longer qualify
+        cursor.execute(
+            f"DELETE FROM {table} WHERE ({key_column}, season) IN "
+            f"(SELECT * FROM unnest(%(keys)s::text[], %(key_seasons)s::int[]));",
+            params
+        )
+        cursor.execute(query, params)
+        written = cursor.rowcount
+
+    invalidate_response_cache(table)
+    logger.info(f"Refreshed {len(queued)} {summary} summaries ({written} rows) in "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms")
+    return len(queued)
+
+def refresh_summaries(full=False):
+    """
+    Brings every summary table up to date with the rows ingested since the last refresh. With full=True the
+    summaries are rebuilt from scratch.
+    """
+    print("Refreshing season summaries...")
+    if full:
+        with db_cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO summary_refresh_queue (summary, key, season)
+                SELECT 'team', home_code, season FROM games WHERE home_code IS NOT NULL
+                UNION
+                SELECT 'team', visitor_code, season FROM games WHERE visitor_code IS NOT NULL
+                UNION
+                SELECT 'player', player_id, season FROM player_statlines
+                ON CONFLICT (summary, key, season) DO NOTHING;
+                """
+            )
+            cursor.execute("TRUNCATE team_season_summaries, player_season_summaries;")
+
+    refreshed = {summary: refresh_summary(summary) for summary in SUMMARIES}
+    print(f"Season summaries refreshed ({', '.join(f'{count} {name}' for name, count in refreshed.items())}).")
+    return refreshed
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 
 def parse_date(date_str):
     """Converts a date string to a datetime object."""
@@ -13,6 +13,17 @@ def parse_date(date_str):
                 return None
     else:
         return None
+
+# NatStat pro football seasons run from March to February, so January/February games belong to the prior season
+SEASON_START_MONTH = 3
+
+def season_for_date(value):
+    """Returns the season (int) a date, datetime or ISO date string falls in, or None if it cannot be parsed."""
+    if isinstance(value, str):
+        value = parse_date(value)
+    if not isinstance(value, date):
+        return None
+    return value.year if value.month >= SEASON_START_MONTH else value.year - 1
     
 
 import json
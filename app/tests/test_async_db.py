@@ -0,0 +1,41 @@
+import os
+import asyncio
+import pytest
+from services import async_db
+
+pytestmark = pytest.mark.skipif(not os.getenv('DB_HOST'), reason="needs a PostgreSQL database (DB_HOST)")
+
+PREPARED_COUNT = "SELECT count(*) FROM pg_prepared_statements"
+
+@pytest.fixture
+def single_connection_pool(monkeypatch):
+    """Runs async_db against a one-connection pool so every call lands on the same connection."""
+    from services.migrations import run_migrations
+    run_migrations()
+    monkeypatch.setattr(async_db, "DB_ASYNC_POOL_MIN_SIZE", 1)
+    monkeypatch.setattr(async_db, "DB_ASYNC_POOL_MAX_SIZE", 1)
+    monkeypatch.setattr(async_db, "_pool", None)
+
+def test_hot_queries_are_prepared_once_per_connection(single_connection_pool):
+    async def requests():
+        await async_db.fetch_prepared("teams")
+        await async_db.fetchrow_prepared("team", "NOPE")
+        await async_db.fetch_prepared("players", None, 10, 0)
+
+    async def scenario():
+        await async_db.open_async_pool()
+        try:
+            await requests()
+            after_first = (await async_db.fetch(PREPARED_COUNT))[0]["count"]
+            for _ in range(3):
+                await requests()
+            after_repeats = (await async_db.fetch(PREPARED_COUNT))[0]["count"]
+            statements = (await async_db.fetch("SELECT statement FROM pg_prepared_statements"))
+        finally:
+            await async_db.close_async_pool()
+        return after_first, after_repeats, [row["statement"] for row in statements]
+
+    after_first, after_repeats, statements = asyncio.run(scenario())
+    assert after_repeats == after_first
+    for name in ("teams", "team", "players"):
+        assert statements.count(async_db.PREPARED_QUERIES[name]) == 1
@@ -0,0 +1,105 @@
+import time
+import asyncio
+import threading
+import pytest
+from services import data_ingestion
+from services.job_graph import JobGraph
+from services.metrics import JOB_LAST_SUCCESS
+
+def _recorder():
+    events = []
+    lock = threading.Lock()
+
+    def stage(name, seconds=0.0, fail=False, counts=None):
+        def fn():
+            with lock:
+                events.append(("start", name))
+            time.sleep(seconds)
+            with lock:
+                events.append(("end", name))
+            if fail:
+                raise RuntimeError(f"{name} broke")
+            return counts
+        return fn
+    return events, stage
+
+def test_stages_start_after_their_dependencies():
+    events, stage = _recorder()
+    graph = (
+        JobGraph("order_test")
+        .add("teams", stage("teams", 0.02))
+        .add("players", stage("players"), depends_on=["teams"])
+        .add("games", stage("games", 0.05))
+        .add("summaries", stage("summaries"), depends_on=["games", "players"])
+    )
+    report = graph.run()
+    position = {event: index for index, event in enumerate(events)}
+    assert position[("end", "teams")] < position[("start", "players")]
+    assert position[("end", "games")] < position[("start", "summaries")]
+    assert position[("end", "players")] < position[("start", "summaries")]
+    # Independent stages overlap
+    assert position[("start", "games")] < position[("end", "teams")]
+    assert {name: stage["status"] for name, stage in report.items()} == dict.fromkeys(report, "succeeded")
+
+def test_failure_skips_downstream_and_raises_after_the_rest_ran():
+    events, stage = _recorder()
+    graph = (
+        JobGraph("failure_test")
+        .add("teams", stage("teams", fail=True))
+        .add("players", stage("players"), depends_on=["teams"])
+        .add("statlines", stage("statlines"), depends_on=["players"])
+        .add("games", stage("games", counts={"inserted": 3}))
+    )
+    with pytest.raises(Exception, match="failure_test.*teams"):
+        graph.run()
+    report = graph.last_run["stages"]
+    assert report["teams"]["status"] == "failed"
+    assert "teams broke" in report["teams"]["error"]
+    assert report["players"]["status"] == "skipped"
+    assert report["statlines"]["status"] == "skipped"
+    assert report["games"] == dict(report["games"], status="succeeded", counts={"inserted": 3})
+    assert ("start", "players") not in events
+    succeeded = {labels[0][1] for suffix, labels, value in JOB_LAST_SUCCESS.samples()}
+    assert "failure_test.games" in succeeded
+    assert "failure_test.teams" not in succeeded
+    assert "failure_test" not in succeeded
+
+def test_critical_path():
+    graph = (
+        JobGraph("path_test")
+        .add("a", lambda: None)
+        .add("b", lambda: None, depends_on=["a"])
+        .add("c", lambda: None)
+        .add("d", lambda: None, depends_on=["b", "c"])
+    )
+    report = {
+        "a": {"status": "succeeded", "duration_seconds": 1.0},
+        "b": {"status": "succeeded", "duration_seconds": 2.0},
+        "c": {"status": "succeeded", "duration_seconds": 4.0},
+        "d": {"status": "succeeded", "duration_seconds": 0.5},
+    }
+    assert graph.critical_path(report) == (4.5, ["c", "d"])
+    report["b"]["duration_seconds"] = 5.0
+    assert graph.critical_path(report) == (6.5, ["a", "b", "d"])
+    # Skipped stages add no time
+    report["d"] = {"status": "skipped"}
+    assert graph.critical_path(report) == (6.0, ["a", "b", "d"])
+
+def test_add_rejects_duplicate_and_unknown_stages():
+    graph = JobGraph("add_test").add("a", lambda: None)
+    with pytest.raises(ValueError):
+        graph.add("a", lambda: None)
+    with pytest.raises(ValueError):
+        graph.add("b", lambda: None, depends_on=["missing"])
+
+class _FailingClient:
+    async def get_json(self, url, endpoint="default"):
+        raise RuntimeError("NatStat is down")
+
+@pytest.mark.parametrize("ingest", [data_ingestion.ingest_players_async, data_ingestion.ingest_games_async])
+def test_incomplete_paginated_ingestion_raises(ingest, monkeypatch):
+    monkeypatch.setattr(data_ingestion, "get_validator_store", lambda: None)
+    monkeypatch.setattr(data_ingestion, "get_watermark", lambda name: None)
+    monkeypatch.setattr(data_ingestion, "set_watermark", lambda name, value: pytest.fail("watermark advanced"))
+    with pytest.raises(Exception, match="stopped on an error"):
+        asyncio.run(ingest(_FailingClient()))
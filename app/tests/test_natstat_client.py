@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import pytest
+from services import natstat_client
+from services.natstat_client import TokenBucket, parse_retry_after, backoff_delay
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(natstat_client.time, "monotonic", clock)
+    return clock
+
+def test_token_bucket_burst_then_paced(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Each reservation past the burst waits one more refill interval
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+def test_token_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    for _ in range(3):
+        bucket.reserve()
+    clock.now += 1.0  # Two tokens back
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
+    clock.now += 100.0  # Never more than capacity
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.5)
+
+@pytest.mark.parametrize("value, seconds", [
+    ("0", 0.0),
+    ("7", 7.0),
+    ("2.5", 2.5),
+    ("-3", 0.0),
+    (None, None),
+    ("", None),
+    ("soon", None),
+])
+def test_parse_retry_after_seconds(value, seconds):
+    assert parse_retry_after(value) == seconds
+
+def test_parse_retry_after_http_date():
+    future = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert parse_retry_after(format_datetime(future, usegmt=True)) == pytest.approx(30, abs=2)
+    past = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert parse_retry_after(format_datetime(past, usegmt=True)) == 0.0
+
+def test_backoff_delay_is_full_jitter_exponential(monkeypatch):
+    monkeypatch.setattr(natstat_client.random, "uniform", lambda low, high: high)
+    assert [backoff_delay(attempt, base=1, cap=60) for attempt in range(8)] == [1, 2, 4, 8, 16, 32, 60, 60]
+    monkeypatch.setattr(natstat_client.random, "uniform", lambda low, high: low)
+    assert backoff_delay(5, base=1, cap=60) == 0
+
+def test_backoff_delay_retry_after_is_a_capped_floor(monkeypatch):
+    monkeypatch.setattr(natstat_client.random, "uniform", lambda low, high: low)
+    assert backoff_delay(0, retry_after=10, base=1, cap=60) == 10
+    assert backoff_delay(0, retry_after=600, base=1, cap=60) == 60
+    monkeypatch.setattr(natstat_client.random, "uniform", lambda low, high: high)
+    assert backoff_delay(4, retry_after=3, base=1, cap=60) == 16
@@ -0,0 +1,69 @@
+import json
+import asyncio
+import pytest
+from services import response_archive
+from services.response_archive import ResponseArchive, ReplayNatStatClient, ArchiveMiss
+from services.data_ingestion import _ingest_paginated
+
+CODECS = ["gzip"] + (["zstd"] if response_archive.zstandard is not None else [])
+
+def _page(page, next_url=None):
+    body = {
+        "success": "1",
+        "games": {f"game_{page}{n}": {"id": f"{page}{n}", "gameday": "2024-09-08"} for n in range(3)},
+        "meta": {"page": str(page), **({"page-next": next_url} if next_url else {})},
+        "query": {"uri": f"http://natstat/games?page={page}"},
+    }
+    return json.dumps(body).encode()
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip_and_dedup(tmp_path, codec):
+    archive = ResponseArchive(root=str(tmp_path), codec=codec)
+    body = _page(1)
+    sha = archive.put("http://natstat/games?page=1", "games", body)
+    assert archive.put("http://natstat/games?page=1", "games", body) == sha
+    # The same body under another URL is indexed but shares the blob
+    archive.put("http://natstat/games?copy=1", "games", body)
+    assert archive.get("http://natstat/games?page=1") == body
+    assert archive.get_json("http://natstat/games?copy=1") == json.loads(body)
+    stats = archive.stats()
+    assert (stats["archived"], stats["unchanged"], stats["blobs_written"]) == (2, 1, 1)
+    assert len(list(tmp_path.glob("blobs/*/*"))) == 1
+
+def test_latest_body_wins_and_survives_reopen(tmp_path):
+    archive = ResponseArchive(root=str(tmp_path), codec="gzip")
+    archive.put("http://natstat/teams", "teams", b'{"v": 1}')
+    archive.put("http://natstat/games", "games", b'{"g": 1}')
+    archive.put("http://natstat/teams", "teams", b'{"v": 2}')
+    reopened = ResponseArchive(root=str(tmp_path), codec=CODECS[-1])
+    assert reopened.get_json("http://natstat/teams") == {"v": 2}
+    assert [entry["url"] for entry in reopened.entries()] == ["http://natstat/games", "http://natstat/teams"]
+    assert [entry["endpoint"] for entry in reopened.entries("teams")] == ["teams"]
+
+def test_miss_raises(tmp_path):
+    archive = ResponseArchive(root=str(tmp_path), codec="gzip")
+    with pytest.raises(ArchiveMiss):
+        archive.get("http://natstat/never")
+    with pytest.raises(ArchiveMiss):
+        archive.read_blob("0" * 64)
+
+def test_replay_client_drives_paginated_ingestion(tmp_path):
+    archive = ResponseArchive(root=str(tmp_path), codec="gzip")
+    archive.put("http://natstat/games?page=1", "games", _page(1, "http://natstat/games?page=2"))
+    archive.put("http://natstat/games?page=2", "games", _page(2))
+    stored = []
+
+    def store(data):
+        stored.extend(data["games"])
+        return {"inserted": len(data["games"])}
+
+    complete, totals = asyncio.run(_ingest_paginated(ReplayNatStatClient(archive), "http://natstat/games?page=1",
+                                                     "games", store, prefetch_pages=0))
+    assert complete
+    assert totals["inserted"] == 6
+    assert stored == [f"game_{page}{n}" for page in (1, 2) for n in range(3)]
+
+def test_replay_client_raises_on_unarchived_url(tmp_path):
+    client = ReplayNatStatClient(ResponseArchive(root=str(tmp_path), codec="gzip"))
+    with pytest.raises(ArchiveMiss):
+        asyncio.run(client.get_json("http://natstat/games?page=1", "games"))
@@ -0,0 +1,48 @@
+import asyncio
+from services.response_cache import ResponseCache
+
+def test_hit_after_load():
+    cache = ResponseCache(maxsize=8, ttl=60)
+    calls = []
+    loader = lambda: calls.append(1) or ["row"]
+    assert cache.get_or_load(("games", 1), loader) == ["row"]
+    assert cache.get_or_load(("games", 1), loader) == ["row"]
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+def test_invalidation_during_load_is_not_cached():
+    cache = ResponseCache(maxsize=8, ttl=60)
+
+    def loader():
+        cache.invalidate("games")  # An ingestion write commits while the query runs
+        return ["old row"]
+
+    assert cache.get_or_load(("games", 1), loader) == ["old row"]
+    assert cache.get_or_load(("games", 1), lambda: ["new row"]) == ["new row"]
+    assert cache.stats()["stale_loads"] == 1
+
+def test_other_table_invalidation_does_not_discard_load():
+    cache = ResponseCache(maxsize=8, ttl=60)
+
+    def loader():
+        cache.invalidate("players")
+        return ["game"]
+
+    cache.get_or_load(("games", 1), loader)
+    assert cache.get_or_load(("games", 1), lambda: ["reloaded"]) == ["game"]
+
+def test_full_invalidation_during_async_load_is_not_cached():
+    cache = ResponseCache(maxsize=8, ttl=60)
+
+    async def loader():
+        cache.invalidate()
+        return ["old row"]
+
+    async def new_loader():
+        return ["new row"]
+
+    async def scenario():
+        assert await cache.get_or_load_async(("games", 1), loader) == ["old row"]
+        return await cache.get_or_load_async(("games", 1), new_loader)
+
+    assert asyncio.run(scenario()) == ["new row"]
@@ -0,0 +1,23 @@
+from datetime import date, datetime
+import pytest
+from services.utility import season_for_date
+
+@pytest.mark.parametrize("value, season", [
+    (date(2024, 3, 1), 2024),           # Seasons start in March
+    (date(2024, 9, 8), 2024),
+    (date(2024, 12, 31), 2024),
+    (date(2025, 1, 1), 2024),           # January and February belong to the prior season
+    (date(2025, 2, 28), 2024),
+    (date(2024, 2, 29), 2023),
+    (datetime(2024, 3, 1, 0, 0), 2024),
+    ("2024-02-29", 2023),
+    ("2024-03-01", 2024),
+    ("2024-10-06T13:00:00Z", 2024),
+    ("2025-02-09T18:30:00+00:00", 2024),
+])
+def test_season_for_date(value, season):
+    assert season_for_date(value) == season
+
+@pytest.mark.parametrize("value", [None, "", "not a date", 2024, {}])
+def test_season_for_date_unparseable(value):
+    assert season_for_date(value) is None